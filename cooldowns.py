@@ -0,0 +1,63 @@
+import time
+
+
+class CooldownStore:
+    """
+    Cooldown per key (misal: user ID) yang membersihkan dirinya sendiri.
+    Waktu habis disimpan sebagai float monotonic, dan key dikelompokkan ke bucket per `resolution` detik.
+    Bucket yang sudah lewat dibuang saat sweep, jadi isi store sebanding dengan user yang aktif
+    dalam `duration` detik terakhir (ditambah paling lama satu bucket).
+    """
+
+    def __init__(self, duration: float, resolution: float = 5.0):
+        """
+        :param duration: Lama cooldown (detik).
+        :param resolution: Lebar bucket (detik) sekaligus jeda minimal antar sweep.
+        """
+        self.duration = duration
+        self.resolution = max(resolution, 0.001)
+        self._expires = {}   # {key: waktu habis (monotonic)}
+        self._buckets = {}   # {nomor bucket: [key, ...]}
+        self._next_sweep = time.monotonic() + self.resolution
+
+    def __len__(self):
+        return len(self._expires)
+
+    def __contains__(self, key):
+        expires = self._expires.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def try_acquire(self, key) -> bool:
+        """Mulai cooldown untuk key. Return False jika key masih dalam cooldown."""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        expires = self._expires.get(key)
+        if expires is not None and expires > now:
+            return False
+
+        expires = now + self.duration
+        self._expires[key] = expires
+        self._buckets.setdefault(int(expires // self.resolution), []).append(key)
+        return True
+
+    def reset(self, key):
+        """Hapus cooldown key (entri lama di bucket diabaikan saat sweep)."""
+        self._expires.pop(key, None)
+
+    def sweep(self, now: float = None) -> int:
+        """Buang semua key yang cooldown-nya sudah habis. Return jumlah key yang dihapus."""
+        if now is None:
+            now = time.monotonic()
+        self._next_sweep = now + self.resolution
+        current_bucket = int(now // self.resolution)
+        removed = 0
+        for bucket in [b for b in self._buckets if b < current_bucket]:
+            for key in self._buckets.pop(bucket):
+                expires = self._expires.get(key)
+                # Key yang cooldown-nya sudah diperbarui ada di bucket lain, jangan dihapus
+                if expires is not None and expires <= now:
+                    del self._expires[key]
+                    removed += 1
+        return removed
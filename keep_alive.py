@@ -1,29 +1,145 @@
-from flask import Flask
-from threading import Thread
-import os
+import asyncio
 import logging
+import math
+import time
 
-# Matikan log Flask yang berisik agar console lebih bersih
-logging.getLogger('werkzeug').setLevel(logging.ERROR)
-
-app = Flask('')
-
-@app.route('/')
-def home():
-    return "Bot is online!"
-
-def run():
-  # Gunakan port 8080 sebagai default (lebih standar untuk Replit/Glitch)
-  port = int(os.environ.get('PORT', 8080))
-  print(f"🌍 Web Server berjalan di Port {port}!")
-  print(f"👉 Jika di Laptop: Buka http://localhost:{port} di browser untuk cek.")
-  print(f"👉 Jika di Cloud: Masukkan URL publik ke UptimeRobot.")
-  try:
-      app.run(host='0.0.0.0', port=port)
-  except Exception as e:
-      print(f"⚠️ Web Server Error (Mungkin port {port} terpakai): {e}")
-
-def keep_alive():
-    t = Thread(target=run)
-    t.daemon = True # Penting: Agar web server ikut mati jika bot crash (supaya UptimeRobot tahu)
-    t.start()
\ No newline at end of file
+from aiohttp import web
+
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Mengukur keterlambatan event loop: task tidur `interval` detik lalu mencatat selisih
+    waktu bangun dengan jadwalnya. Lag besar = ada kode blocking di loop bot.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0        # lag sampel terakhir (detik)
+        self.max_lag = 0.0    # lag terbesar sejak start
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            scheduled = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.perf_counter() - scheduled)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class HealthServer:
+    """
+    Web server aiohttp yang berjalan di event loop bot (tanpa thread terpisah).
+    - /         : "Bot is online!" (untuk UptimeRobot)
+    - /healthz  : liveness, 200 selama bot belum ditutup dan event loop tidak macet
+    - /readyz   : readiness, 200 hanya jika gateway tersambung, DB menjawab, dan lag loop rendah
+    - /metrics  : metrik format Prometheus
+    """
+
+    def __init__(self, bot, port: int = 8080, max_loop_lag: float = 1.0, db_timeout: float = 2.0):
+        """
+        :param bot: Instance MyBot (dibaca langsung, aman karena satu loop).
+        :param port: Port HTTP.
+        :param max_loop_lag: Lag event loop (detik) di atas ini dianggap tidak sehat.
+        :param db_timeout: Batas waktu ping database untuk /readyz.
+        """
+        self.bot = bot
+        self.port = port
+        self.max_loop_lag = max_loop_lag
+        self.db_timeout = db_timeout
+        self.loop_lag = LoopLagMonitor()
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/healthz', self.healthz)
+        self.app.router.add_get('/readyz', self.readyz)
+        self.app.router.add_get('/metrics', self.metrics_endpoint)
+        metrics.add_collector(self.collect_metrics)
+
+    async def start(self):
+        self.loop_lag.start()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, '0.0.0.0', self.port).start()
+        except OSError as e:
+            log.error(f"⚠️ Web Server Error (Mungkin port {self.port} terpakai): {e}")
+            return
+        log.info(f"🌍 Web Server berjalan di Port {self.port}!")
+        log.info(f"👉 Jika di Laptop: Buka http://localhost:{self.port} di browser untuk cek.")
+        log.info("👉 Jika di Cloud: Masukkan URL publik ke UptimeRobot (atau /readyz untuk orkestrator).")
+
+    async def stop(self):
+        await self.loop_lag.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _loop_check(self):
+        lag = self.loop_lag.lag
+        return {'ok': lag <= self.max_loop_lag, 'lag_ms': round(lag * 1000, 1), 'max_lag_ms': round(self.loop_lag.max_lag * 1000, 1)}
+
+    def _gateway_check(self):
+        latency = self.bot.latency
+        connected = self.bot.is_ready() and not self.bot.is_closed() and self.bot.ws is not None
+        check = {'ok': connected, 'guilds': len(self.bot.guilds)}
+        if not math.isnan(latency) and not math.isinf(latency):
+            check['latency_ms'] = round(latency * 1000, 1)
+        return check
+
+    async def _database_check(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.bot.db.ping(), timeout=self.db_timeout)
+        except Exception as e:
+            return {'ok': False, 'error': type(e).__name__}
+        check = {'ok': True, 'ping_ms': round((time.perf_counter() - start) * 1000, 1)}
+        pool = self.bot.db.pool_stats()
+        if 'size' in pool:
+            check.update(pool_size=pool['size'], pool_in_use=pool['in_use'], pool_max_size=pool['max_size'])
+        return check
+
+    async def home(self, request):
+        return web.Response(text="Bot is online!")
+
+    async def healthz(self, request):
+        # Jika handler ini bisa menjawab, loop masih hidup; lag besar tetap dilaporkan sebagai gagal
+        loop_check = self._loop_check()
+        ok = loop_check['ok'] and not self.bot.is_closed()
+        return web.json_response({'status': 'ok' if ok else 'fail', 'loop': loop_check}, status=200 if ok else 503)
+
+    async def readyz(self, request):
+        checks = {
+            'gateway': self._gateway_check(),
+            'database': await self._database_check(),
+            'loop': self._loop_check(),
+        }
+        ok = all(check['ok'] for check in checks.values())
+        return web.json_response({'status': 'ok' if ok else 'fail', 'checks': checks}, status=200 if ok else 503)
+
+    async def metrics_endpoint(self, request):
+        # Format teks Prometheus (latensi command/view, statistik DB, gateway, cache)
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    def collect_metrics(self):
+        return [
+            ("event_loop_lag_seconds", "gauge", "Keterlambatan event loop bot (sampel terakhir).", {}, self.loop_lag.lag),
+            ("event_loop_lag_max_seconds", "gauge", "Keterlambatan event loop terbesar sejak start.", {}, self.loop_lag.max_lag),
+        ]
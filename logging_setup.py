@@ -0,0 +1,72 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Level default logger library (DEBUG discord.py/asyncpg mencatat setiap event gateway & HTTP)
+DEFAULT_LOGGER_LEVELS = {
+    'discord': 'INFO',
+    'asyncpg': 'INFO',
+    'aiohttp': 'INFO',
+}
+
+TEXT_FORMAT = '[%(asctime)s] %(levelname)s %(name)s: %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu baris JSON per log (untuk dikumpulkan log aggregator)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_logger_levels(spec: str) -> dict:
+    """Mengubah 'discord.gateway=WARNING,asyncpg=DEBUG' menjadi dict {logger: level}. Entri tidak valid dilewati."""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        level = level.strip().upper()
+        if sep and name.strip() and isinstance(logging.getLevelName(level), int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(level: str = 'INFO', json_output: bool = False, logger_levels: dict = None) -> logging.handlers.QueueListener:
+    """
+    Memasang pipeline log non-blocking: semua logger menulis ke QueueHandler (hanya memasukkan record
+    ke antrean), lalu QueueListener di thread terpisah yang memformat dan menulis ke stdout.
+    :param level: Level root logger (kode bot).
+    :param json_output: True = satu baris JSON per log, False = teks biasa.
+    :param logger_levels: Level per logger, menimpa DEFAULT_LOGGER_LEVELS.
+    :return: QueueListener yang sudah berjalan (dihentikan otomatis saat proses keluar).
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(logging.getLevelName(level.upper()), int) else logging.INFO)
+
+    for name, logger_level in {**DEFAULT_LOGGER_LEVELS, **(logger_levels or {})}.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener.start()
+    # Sisa log di antrean tetap ditulis sebelum proses selesai
+    atexit.register(listener.stop)
+    return listener
@@ -9,23 +9,78 @@ from datetime import datetime, timedelta, timezone, time
 import aiohttp
 import logging
 import sys
-
-# Impor kelas DatabaseManager yang kita buat
-from database import DatabaseManager
-from keep_alive import keep_alive
+import math
+import weakref
+from time import perf_counter
+
+# Impor factory DatabaseManager yang kita buat (backend dipilih dari skema DATABASE_URL)
+from database import create_database
+from keep_alive import HealthServer
+from xp_ledger import XPLedger
+from cooldowns import CooldownStore
+from message_waiters import MessageWaiters
+from meme_buffer import MemeBuffer
+from metrics import metrics
+from tracing import InteractionTracer
+from logging_setup import setup_logging, parse_logger_levels
 
 # --- Konfigurasi & Variabel Global ---
 load_dotenv(override=True)
 
-# Setup Logging agar error muncul di Leapcell
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='[%(asctime)s] %(levelname)s: %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
+# Setup Logging agar error muncul di Leapcell (lewat antrean, tidak memblokir event loop)
+# LOG_LEVEL: level kode bot, LOG_FORMAT: text/json, LOG_LEVELS: level per logger (misal: discord.gateway=WARNING)
+setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    json_output=os.getenv('LOG_FORMAT', 'text').lower() == 'json',
+    logger_levels=parse_logger_levels(os.getenv('LOG_LEVELS', '')),
 )
+log = logging.getLogger('bot')
 
 TOKEN = os.getenv('DISCORD_TOKEN')
 DATABASE_URL = os.getenv('DATABASE_URL')
+# Prepared statement: 'auto' (mati jika lewat pooler port 6543), 'on', atau 'off'
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'auto').lower()
+# Cache baca data user di memori (0 = mati)
+try:
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+except ValueError:
+    USER_CACHE_SIZE, USER_CACHE_TTL = 10000, 60.0
+# Interval muat ulang cache Top-N leaderboard global (0 = mati)
+try:
+    LEADERBOARD_CACHE_TTL = float(os.getenv('LEADERBOARD_CACHE_TTL', '300'))
+except ValueError:
+    LEADERBOARD_CACHE_TTL = 300.0
+# Connection pool database (lihat DatabaseManager untuk penjelasan tiap opsi)
+try:
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '10'))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+    DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+    DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', '60'))
+except ValueError:
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_MAX_IDLE, DB_COMMAND_TIMEOUT = 10, 10, 300.0, 60.0
+# Query yang lebih lama dari ini (ms) dicatat ke slow query log (0 = mati)
+try:
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+except ValueError:
+    DB_SLOW_QUERY_MS = 200.0
+# Web server health check (/healthz, /readyz, /metrics) di event loop bot
+try:
+    PORT = int(os.getenv('PORT', '8080'))
+    HEALTH_MAX_LOOP_LAG = float(os.getenv('HEALTH_MAX_LOOP_LAG', '1.0'))
+except ValueError:
+    PORT, HEALTH_MAX_LOOP_LAG = 8080, 1.0
+# Interaksi yang respons awalnya lebih lambat dari (3 detik - margin) dicatat di log
+try:
+    INTERACTION_WARN_MARGIN = float(os.getenv('INTERACTION_WARN_MARGIN', '0.5'))
+except ValueError:
+    INTERACTION_WARN_MARGIN = 0.5
+# Meme API untuk /fun meme (bisa diarahkan ke meme_stub.py) dan jumlah meme yang di-prefetch
+MEME_API_URL = os.getenv('MEME_API_URL', 'https://meme-api.com')
+try:
+    MEME_BUFFER_SIZE = int(os.getenv('MEME_BUFFER_SIZE', '20'))
+except ValueError:
+    MEME_BUFFER_SIZE = 20
 try:
     BIRTHDAY_CHANNEL_ID = int(os.getenv('BIRTHDAY_CHANNEL_ID', '0')) # Ambil dari .env
 except ValueError:
@@ -37,10 +92,22 @@ TEBAK_KATA_REWARD = 150
 MATH_BATTLE_REWARD = 100
 HIGHER_LOWER_REWARD = 300
 
+# Prefix command teks (hanya dipakai command owner seperti !sync)
+COMMAND_PREFIX = '!'
+
 # Konfigurasi Leveling
 XP_PER_MESSAGE_MIN = 15
 XP_PER_MESSAGE_MAX = 25
 XP_COOLDOWN_SECONDS = 60
+# XP ditampung di memori lalu ditulis massal ke DB (0 = tulis langsung per pesan)
+try:
+    XP_FLUSH_INTERVAL = float(os.getenv('XP_FLUSH_INTERVAL', '5'))
+except ValueError:
+    XP_FLUSH_INTERVAL = 5.0
+try:
+    XP_FLUSH_MAX_SIZE = int(os.getenv('XP_FLUSH_MAX_SIZE', '500'))
+except ValueError:
+    XP_FLUSH_MAX_SIZE = 500
 
 KATA_LIST = [
     # Kata-kata sehari-hari
@@ -56,50 +123,183 @@ KATA_LIST = [
     "transportasi", "komunikasi", "teknologi", "lingkungan", "pemerintah"
 ]
 
+# Tracing interaksi: waktu sampai respons awal, DB, dan REST per command
+tracer = InteractionTracer(warn_margin=INTERACTION_WARN_MARGIN)
+
+class TracedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Dipanggil di task yang sama dengan handler command, jadi query DB & request REST ikut tercatat
+        if interaction.type is discord.InteractionType.application_command:
+            tracer.start(interaction, interaction.command.qualified_name if interaction.command else "unknown")
+        return True
+
 class MyBot(commands.Bot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True # Diperlukan untuk leaderboard server
         
-        super().__init__(command_prefix='!', intents=intents)
-        
-        # Inisialisasi DatabaseManager
-        self.db = DatabaseManager(dsn=DATABASE_URL)
-        # Cooldown untuk on_message agar tidak membebani DB
-        self.xp_cooldowns = {}
+        super().__init__(command_prefix=COMMAND_PREFIX, intents=intents, tree_cls=TracedCommandTree, http_trace=tracer.http_trace())
+        
+        # Inisialisasi DatabaseManager (DATABASE_URL=memory:// untuk backend in-memory)
+        prepared = {'on': True, 'off': False}.get(DB_PREPARED_STATEMENTS)
+        self.db = create_database(DATABASE_URL, prepared_statements=prepared, cache_size=USER_CACHE_SIZE, cache_ttl=USER_CACHE_TTL,
+                                  leaderboard_ttl=LEADERBOARD_CACHE_TTL, pool_min_size=DB_POOL_MIN_SIZE, pool_max_size=DB_POOL_MAX_SIZE,
+                                  pool_max_idle=DB_POOL_MAX_IDLE, command_timeout=DB_COMMAND_TIMEOUT,
+                                  slow_query_ms=DB_SLOW_QUERY_MS)
+        # Cooldown untuk on_message agar tidak membebani DB (entri kedaluwarsa dibuang otomatis)
+        self.xp_cooldowns = CooldownStore(XP_COOLDOWN_SECONDS)
+        # Game yang menunggu jawaban chat (tebakkata, mathbattle, higherlower)
+        self.message_waiters = MessageWaiters()
+        # Session HTTP bersama untuk API luar (dibuat di setup_hook, koneksi dipakai ulang)
+        self.http_session = None
+        self.meme_buffer = MemeBuffer(MEME_API_URL, size=MEME_BUFFER_SIZE)
+        # Server yang daftar membernya sudah di-backfill ke tabel guild_members sejak bot start
+        self.synced_member_guilds = set()
+        # Penampung XP write-behind (None jika dimatikan lewat XP_FLUSH_INTERVAL=0)
+        self.xp_ledger = None
+        if XP_FLUSH_INTERVAL > 0:
+            self.xp_ledger = XPLedger(self.db, flush_interval=XP_FLUSH_INTERVAL, max_batch=XP_FLUSH_MAX_SIZE, on_level_up=self.on_ledger_level_up)
+        # Nilai gauge/counter untuk endpoint /metrics dibaca saat scrape
+        metrics.add_collector(self.collect_metrics)
+        metrics.add_collector(tracer.collect_metrics)
+        self.health_server = HealthServer(self, port=PORT, max_loop_lag=HEALTH_MAX_LOOP_LAG)
 
     async def login(self, token: str) -> None:
         # FIX: Bypass SSL verification dipindahkan ke sini agar dijalankan di dalam event loop
-        print("🔧 Mengatur koneksi SSL bypass...", flush=True)
+        log.info("🔧 Mengatur koneksi SSL bypass...")
         # Kita harus me-reset session agar menggunakan connector baru (tanpa SSL)
         self.http.connector = aiohttp.TCPConnector(ssl=False)
         await self.http.close() # Tutup session lama
         await super().login(token)
 
     async def setup_hook(self):
+        # Web server jalan lebih dulu agar /healthz bisa dicek selama startup (/readyz masih 503)
+        await self.health_server.start()
+
         # Hubungkan ke DB dan siapkan tabel sebelum bot siap
-        print("⚙️  Sedang menghubungkan ke Database...", flush=True)
+        log.info("⚙️  Sedang menghubungkan ke Database...")
         try:
             await self.db.connect()
             await self.db.init_db()
-            print("✅ Database terhubung dan tabel siap.", flush=True)
+            await self.db.warmup()
+            log.info("✅ Database terhubung dan tabel siap.")
         except Exception as e:
-            logging.error(f"❌ Gagal inisialisasi database: {e}")
+            log.exception(f"❌ Gagal inisialisasi database: {e}")
             raise e
 
         # Mulai background task
         self.birthday_checker.start()
+        if self.xp_ledger is not None:
+            self.xp_ledger.start()
+        self.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        self.meme_buffer.start(self.http_session)
         
         # Selama development, lebih baik sync per server menggunakan !sync.
         # Baris di bawah ini bisa diaktifkan kembali jika bot sudah final.
         # await self.tree.sync()
     
     async def on_ready(self):
-        print(f'✅ BOT ONLINE: {self.user} (ID: {self.user.id}) siap digunakan!', flush=True)
-        print('------', flush=True)
+        log.info(f'✅ BOT ONLINE: {self.user} (ID: {self.user.id}) siap digunakan!')
+        # Backfill keanggotaan server sekali per proses (on_ready bisa terpanggil lagi saat reconnect)
+        for guild in self.guilds:
+            if guild.id not in self.synced_member_guilds:
+                self.synced_member_guilds.add(guild.id)
+                asyncio.create_task(self.sync_guild_members(guild))
+
+    async def sync_guild_members(self, guild: discord.Guild):
+        """Menyalin daftar member (non-bot) sebuah server ke tabel guild_members."""
+        try:
+            if not guild.chunked:
+                await guild.chunk()
+            member_ids = [m.id for m in guild.members if not m.bot]
+            await self.db.sync_guild_members(guild.id, member_ids)
+            log.info(f"👥 Sinkronisasi {len(member_ids)} member server {guild.name} selesai.")
+        except Exception as e:
+            log.exception(f"❌ Gagal sinkronisasi member server {guild.id}: {e}")
+
+    async def on_guild_join(self, guild: discord.Guild):
+        self.synced_member_guilds.add(guild.id)
+        await self.sync_guild_members(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.synced_member_guilds.discard(guild.id)
+        await self.db.remove_guild(guild.id)
+
+    async def on_member_join(self, member: discord.Member):
+        if not member.bot:
+            await self.db.add_guild_member(member.guild.id, member.id)
+
+    async def on_member_remove(self, member: discord.Member):
+        await self.db.remove_guild_member(member.guild.id, member.id)
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        finish_interaction(interaction, "ok")
+
+    def collect_metrics(self):
+        """Sampel gauge/counter untuk /metrics: (name, type, help, labels, value)."""
+        samples = [
+            ("discord_guilds", "gauge", "Jumlah server yang diikuti bot.", {}, len(self.guilds)),
+            ("discord_active_views", "gauge", "Jumlah view game yang masih aktif.", {},
+             sum(1 for view in list(BaseGameView.instances) if not view.is_finished())),
+        ]
+        if not math.isnan(self.latency) and not math.isinf(self.latency):
+            samples.append(("discord_gateway_latency_seconds", "gauge", "Latensi heartbeat gateway Discord.", {}, self.latency))
+        samples.append(("meme_buffer_size", "gauge", "Meme yang siap dikirim di antrean prefetch.", {}, len(self.meme_buffer)))
+        samples.append(("game_message_waiters", "gauge", "Game yang sedang menunggu jawaban chat.", {}, len(self.message_waiters)))
+        samples.append(("xp_cooldown_entries", "gauge", "User yang sedang dalam cooldown XP (store cooldown).", {}, len(self.xp_cooldowns)))
+        if self.xp_ledger is not None:
+            samples.append(("xp_ledger_pending_users", "gauge", "User dengan XP yang belum di-flush ke DB.", {}, len(self.xp_ledger)))
+
+        pool = self.db.pool_stats()
+        samples.append(("db_queries_total", "counter", "Jumlah query yang dikirim ke database.", {}, pool['query_count']))
+        if 'acquires' in pool:
+            samples += [
+                ("db_query_seconds_total", "counter", "Total waktu eksekusi query database.", {}, pool['query_seconds']),
+                ("db_queries_per_second", "gauge", "Laju query database (jendela terakhir).", {}, pool['queries_per_second']),
+                ("db_pool_acquires_total", "counter", "Jumlah pengambilan koneksi dari pool.", {}, pool['acquires']),
+                ("db_pool_acquire_wait_seconds_total", "counter", "Total waktu menunggu koneksi pool.", {}, pool['wait_seconds']),
+            ]
+        if 'size' in pool:
+            samples += [
+                ("db_pool_connections", "gauge", "Koneksi di pool menurut status.", {"state": "in_use"}, pool['in_use']),
+                ("db_pool_connections", "gauge", "Koneksi di pool menurut status.", {"state": "idle"}, pool['size'] - pool['in_use']),
+                ("db_pool_max_connections", "gauge", "Ukuran maksimal pool.", {}, pool['max_size']),
+            ]
+
+        # Satu loop per metrik agar sampel satu family berurutan di output
+        query_stats = self.db.query_stats()
+        samples += [("db_method_calls_total", "counter", "Jumlah panggilan method DatabaseManager.",
+                     {"query": query['name']}, query['calls']) for query in query_stats]
+        samples += [("db_method_seconds_total", "counter", "Total durasi method DatabaseManager (termasuk tunggu pool).",
+                     {"query": query['name']}, query['total_seconds']) for query in query_stats]
+        samples += [("db_method_rows_total", "counter", "Total baris yang dikembalikan method DatabaseManager.",
+                     {"query": query['name']}, query['rows']) for query in query_stats]
+
+        cache = self.db.cache_stats()
+        if cache:
+            samples += [
+                ("cache_hits_total", "counter", "Jumlah cache hit.", {"cache": "user"}, cache['hits']),
+                ("cache_misses_total", "counter", "Jumlah cache miss.", {"cache": "user"}, cache['misses']),
+                ("cache_hit_ratio", "gauge", "Rasio cache hit sejak start.", {"cache": "user"}, cache['hit_rate']),
+                ("cache_entries", "gauge", "Jumlah entri di cache.", {"cache": "user"}, cache['size']),
+            ]
+        return samples
     
     async def close(self):
+        # Flush XP yang masih tertunda sebelum koneksi DB ditutup agar tidak ada yang hilang
+        if self.xp_ledger is not None:
+            try:
+                await self.xp_ledger.close()
+            except Exception as e:
+                log.exception(f"❌ Gagal flush XP saat shutdown: {e}")
+        await self.meme_buffer.stop()
+        if self.http_session is not None:
+            await self.http_session.close()
+        await self.health_server.stop()
         await self.db.close()
         await super().close()
 
@@ -109,12 +309,12 @@ class MyBot(commands.Bot):
         await self.wait_until_ready() # Tunggu hingga bot siap dan cache terisi
 
         if BIRTHDAY_CHANNEL_ID == 0:
-            print("BIRTHDAY_CHANNEL_ID tidak diatur, task ulang tahun dilewati.")
+            log.info("🎂 BIRTHDAY_CHANNEL_ID tidak diatur, task ulang tahun dilewati.")
             return
 
         channel = self.get_channel(BIRTHDAY_CHANNEL_ID)
         if not channel:
-            print(f"Channel dengan ID {BIRTHDAY_CHANNEL_ID} tidak ditemukan.")
+            log.warning(f"⚠️ Channel ulang tahun dengan ID {BIRTHDAY_CHANNEL_ID} tidak ditemukan.")
             return
 
         today_str = datetime.now(timezone.utc).strftime('%m-%d')
@@ -123,70 +323,113 @@ class MyBot(commands.Bot):
         if not birthdays_today:
             return # Tidak ada yang ulang tahun, keluar diam-diam
 
-        print(f"Menemukan {len(birthdays_today)} orang yang ulang tahun hari ini!")
-        for record in birthdays_today:
-            user_id = record['user_id']
-            user = self.get_user(user_id)
-
-            if user:
-                # Beri hadiah koin
-                user_data = await self.db.get_user_data(user_id)
-                new_balance = user_data['coins'] + BIRTHDAY_REWARD
-                await self.db.update_user_balance(user_id, new_balance)
-
-                # Kirim ucapan
-                embed = discord.Embed(title="🎉 Selamat Ulang Tahun! 🎂", description=f"Semoga panjang umur dan sehat selalu, {user.mention}! Sebagai hadiah, kamu mendapatkan **{BIRTHDAY_REWARD}** koin!", color=discord.Color.magenta())
-                embed.set_thumbnail(url=user.display_avatar.url)
-                await channel.send(embed=embed)
+        # Hanya user yang masih dikenal bot yang diberi hadiah & ucapan (sama seperti sebelumnya)
+        user_ids = [record['user_id'] for record in birthdays_today if self.get_user(record['user_id'])]
+        # Beri hadiah koin ke semua yang ulang tahun sekaligus (satu query)
+        rewarded = await self.db.pay_birthday_rewards(today_str, BIRTHDAY_REWARD, user_ids)
+
+        if not rewarded:
+            return
+
+        log.info(f"🎂 Menemukan {len(rewarded)} orang yang ulang tahun hari ini!")
+
+        # Kirim ucapan dalam pesan sesedikit mungkin
+        mentions = [f"<@{record['user_id']}>" for record in rewarded]
+        for embeds in build_birthday_messages(mentions):
+            await channel.send(embeds=embeds)
     
     async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
+        if message.author.bot:
             return
 
-        ctx = await self.get_context(message)
-
-        await self.process_commands(message)
+        # Jawaban game chat tidak diproses sebagai command dan tidak memberi XP
+        if self.message_waiters.dispatch(message):
+            return
 
-        if ctx.valid:
+        if not message.guild:
             return
 
+        # Jalur cepat: hanya pesan berawalan prefix yang perlu di-parse sebagai command
+        if message.content.startswith(COMMAND_PREFIX):
+            ctx = await self.get_context(message)
+            await self.invoke(ctx)
+            if ctx.valid:
+                return
+
         # --- Logika Pemberian XP (hanya untuk pesan biasa, bukan command) ---
         user_id = message.author.id
-        now = datetime.now(timezone.utc)
 
         # Cek cooldown dari cache lokal dulu untuk efisiensi
-        last_msg_time = self.xp_cooldowns.get(user_id)
-        if last_msg_time and (now - last_msg_time).total_seconds() < XP_COOLDOWN_SECONDS:
+        if not self.xp_cooldowns.try_acquire(user_id):
             return
-        
-        self.xp_cooldowns[user_id] = now
 
-        # Berikan XP
-        user_data = await self.db.get_user_data(user_id)
         xp_to_add = random.randint(XP_PER_MESSAGE_MIN, XP_PER_MESSAGE_MAX)
-        await self.db.grant_xp(user_id, xp_to_add)
-        
-        # Cek untuk level up
-        current_level = user_data.get('level', 1)
-        current_xp = user_data.get('xp', 0) + xp_to_add
-        xp_needed = (current_level * 100)
 
-        if current_xp >= xp_needed:
-            new_level = current_level + 1
-            xp_left_over = current_xp - xp_needed
-            await self.db.update_level(user_id, new_level, xp_left_over)
-            
-            # UI Level Up Baru
-            embed = discord.Embed(
-                title="🎉 LEVEL UP!",
-                description=f"Selamat {message.author.mention}, kamu telah naik ke **Level {new_level}**!",
-                color=discord.Color.gold()
-            )
-            embed.add_field(name="📈 Level", value=f"{current_level} ➔ **{new_level}**", inline=True)
-            embed.add_field(name="✨ XP", value=f"{xp_left_over} XP (Next: {new_level * 100})", inline=True)
-            embed.set_thumbnail(url=message.author.display_avatar.url)
-            embed.set_footer(text="Terus aktif untuk mencapai level berikutnya!")
-            await message.channel.send(embed=embed)
+        # Jalur utama: tampung di ledger, level up diumumkan saat flush
+        if self.xp_ledger is not None:
+            self.xp_ledger.add(user_id, xp_to_add, message)
+            return
+
+        # Berikan XP (level up sudah dihitung di database dalam satu query)
+        result = await self.db.grant_xp(user_id, xp_to_add)
+        if result and result['new_level'] > result['old_level']:
+            await self.announce_level_up(message, result['old_level'], result['new_level'], result['xp'])
+
+    async def on_ledger_level_up(self, row, message: discord.Message):
+        """Callback XPLedger: umumkan level up di channel pesan terakhir user."""
+        if message is None:
+            return
+        await self.announce_level_up(message, row['old_level'], row['new_level'], row['xp'])
+
+    async def announce_level_up(self, message: discord.Message, old_level: int, new_level: int, xp_left_over: int):
+        # UI Level Up Baru
+        embed = discord.Embed(
+            title="🎉 LEVEL UP!",
+            description=f"Selamat {message.author.mention}, kamu telah naik ke **Level {new_level}**!",
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="📈 Level", value=f"{old_level} ➔ **{new_level}**", inline=True)
+        embed.add_field(name="✨ XP", value=f"{xp_left_over} XP (Next: {new_level * 100})", inline=True)
+        embed.set_thumbnail(url=message.author.display_avatar.url)
+        embed.set_footer(text="Terus aktif untuk mencapai level berikutnya!")
+        await message.channel.send(embed=embed)
+
+# Batas embed Discord
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+EMBEDS_PER_MESSAGE = 10
+
+def build_birthday_messages(mentions: list):
+    """
+    Mengelompokkan ucapan ulang tahun ke embed & pesan sesedikit mungkin sesuai batas embed Discord.
+    Return list pesan, tiap pesan berupa list embed.
+    """
+    title = "🎉 Selamat Ulang Tahun! 🎂"
+    header = f"Semoga panjang umur dan sehat selalu! Sebagai hadiah, kalian masing-masing mendapatkan **{BIRTHDAY_REWARD}** koin!\n\n"
+
+    # 1. Pecah daftar mention menjadi deskripsi embed
+    descriptions = []
+    current = header
+    for mention in mentions:
+        line = f"🎂 {mention}\n"
+        if len(current) + len(line) > EMBED_DESCRIPTION_LIMIT:
+            descriptions.append(current)
+            current = ""
+        current += line
+    descriptions.append(current)
+
+    # 2. Kemas embed ke pesan (maks 10 embed dan 6000 karakter per pesan)
+    messages = []
+    embeds, total = [], 0
+    for description in descriptions:
+        size = len(title) + len(description)
+        if embeds and (len(embeds) >= EMBEDS_PER_MESSAGE or total + size > EMBED_TOTAL_LIMIT):
+            messages.append(embeds)
+            embeds, total = [], 0
+        embeds.append(discord.Embed(title=title, description=description, color=discord.Color.magenta()))
+        total += size
+    messages.append(embeds)
+    return messages
 
 bot = MyBot()
 
@@ -220,48 +463,90 @@ def get_quest_description(q_type, target):
     if q_type == "earn_coins": return f"💰 Dapatkan total **{target:,}** koin dari game"
     return "❓ Quest Misterius"
 
-async def check_quest_completion(interaction: discord.Interaction, quest_type: str, amount: int = 1, user: discord.User = None):
-    """Cek dan update progress quest user."""
+async def announce_quest_completion(interaction: discord.Interaction, completed_quest, user: discord.User = None):
+    """Kirim pengumuman quest selesai (panggil setelah respons utama game terkirim)."""
+    if not completed_quest:
+        return
     target_user = user or interaction.user
     try:
-        completed_quest = await bot.db.update_quest_progress(target_user.id, quest_type, amount)
-        if completed_quest:
-            embed = discord.Embed(
-                title="🎉 QUEST SELESAI!",
-                description=f"Selamat {target_user.mention}! Kamu telah menaklukkan misi tingkat **{completed_quest['difficulty']}**.",
-                color=discord.Color.gold()
-            )
-            embed.add_field(name="📜 Misi", value=get_quest_description(completed_quest['quest_type'], completed_quest['target']), inline=False)
-            embed.add_field(name="🎁 Hadiah", value=f"**+{completed_quest['reward']:,}** Koin", inline=False)
-            embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/536/536056.png") # Ikon Piala
-            embed.set_footer(text="Gunakan /quest untuk mengambil misi baru!")
-            
-            # Kirim pesan (gunakan followup jika interaksi sudah direspons)
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed)
-            else:
-                await interaction.response.send_message(embed=embed)
+        embed = discord.Embed(
+            title="🎉 QUEST SELESAI!",
+            description=f"Selamat {target_user.mention}! Kamu telah menaklukkan misi tingkat **{completed_quest['difficulty']}**.",
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="📜 Misi", value=get_quest_description(completed_quest['quest_type'], completed_quest['target']), inline=False)
+        embed.add_field(name="🎁 Hadiah", value=f"**+{completed_quest['reward']:,}** Koin", inline=False)
+        embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/536/536056.png") # Ikon Piala
+        embed.set_footer(text="Gunakan /quest untuk mengambil misi baru!")
+        
+        # Kirim pesan (gunakan followup jika interaksi sudah direspons)
+        if interaction.response.is_done():
+            await interaction.followup.send(embed=embed)
+        else:
+            await interaction.response.send_message(embed=embed)
     except Exception as e:
-        print(f"Error checking quest: {e}")
+        log.exception(f"❌ Gagal mengumumkan quest selesai: {e}")
 
-async def record_game_and_quest(interaction: discord.Interaction, game_name: str):
-    """Mencatat statistik game dan update quest 'play_game'."""
-    await bot.db.record_game_play(interaction.user.id, game_name)
-    await check_quest_completion(interaction, "play_game", 1)
+async def record_game_and_quest(interaction: discord.Interaction, game_name: str, bet: int = 0):
+    """
+    Potong taruhan (jika ada), catat statistik game, dan update quest 'play_game' dalam satu transaksi.
+    Return hasil settle_game, atau None jika saldo tidak cukup.
+    """
+    return await bot.db.settle_game(interaction.user.id, game_name, bet=bet)
+
+def finish_interaction(interaction: discord.Interaction, status: str):
+    """Tutup trace app command dan catat durasinya ke histogram /metrics."""
+    trace = tracer.finish(interaction, status)
+    if trace is not None:
+        metrics.observe_command(trace.name, perf_counter() - trace.started, status)
 
 # --- Base View untuk Error Handling (Anti-Failed) ---
 class BaseGameView(discord.ui.View):
+    # Semua view game yang masih hidup (untuk metrik jumlah view aktif)
+    instances = weakref.WeakSet()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        BaseGameView.instances.add(self)
+        for item in self.children:
+            self._instrument(item)
+
+    def add_item(self, item: discord.ui.Item):
+        self._instrument(item)
+        return super().add_item(item)
+
+    def _instrument(self, item: discord.ui.Item):
+        """Bungkus callback item agar durasinya tercatat di /metrics dan interaksinya di-trace."""
+        if getattr(item, '_metrics_instrumented', False):
+            return
+        # Callback dari decorator menyimpan fungsi aslinya di .callback, subclass Button/Select memakai nama kelasnya
+        name = getattr(getattr(item.callback, 'callback', None), '__name__', type(item).__name__)
+        view_name = type(self).__name__
+        item.callback = tracer.wrap_callback(f"{view_name}.{name}", metrics.timed_callback(view_name, name, item.callback))
+        item._metrics_instrumented = True
+
     async def on_error(self, interaction: discord.Interaction, error: Exception, item: discord.ui.Item) -> None:
-        print(f"❌ Error in View {type(self).__name__}: {error}")
+        log.error(f"❌ Error in View {type(self).__name__}: {error}", exc_info=error)
         embed = discord.Embed(title="❌ Terjadi Kesalahan", description="Maaf, terjadi kesalahan saat memproses interaksi ini. Coba lagi.", color=discord.Color.red())
-        if not interaction.response.is_done():
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-        else:
-            await interaction.followup.send(embed=embed, ephemeral=True)
+        try:
+            if not interaction.response.is_done():
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+            else:
+                await interaction.followup.send(embed=embed, ephemeral=True)
+        finally:
+            # Trace callback yang gagal ditutup di sini agar respons error ikut terhitung
+            tracer.finish(interaction, "error")
 
 # Global error handler untuk slash commands
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    try:
+        await send_command_error(interaction, error)
+    finally:
+        # Ditutup setelah respons error terkirim agar waktu respons awalnya ikut tercatat
+        finish_interaction(interaction, "error")
+
+async def send_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     if isinstance(error, app_commands.errors.CommandOnCooldown):
         embed = discord.Embed(title="⏳ Cooldown", description=f"Perintah ini sedang dalam cooldown. Coba lagi dalam **{error.retry_after:.2f} detik**.", color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -274,7 +559,7 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         await interaction.response.send_message(embed=embed, ephemeral=True)
     else:
         # Untuk error lain, catat di konsol dan beri tahu pengguna.
-        print(f"Error tak tertangani untuk command /{interaction.command.name}: {error}")
+        log.error(f"❌ Error tak tertangani untuk command /{interaction.command.name}: {error}", exc_info=error)
         # Pastikan untuk merespons interaksi agar tidak gagal
         embed = discord.Embed(title="❌ Error", description="Terjadi kesalahan saat menjalankan perintah.", color=discord.Color.red())
         if not interaction.response.is_done():
@@ -584,7 +869,7 @@ bot.tree.add_command(birthday_group)
 
 @bot.tree.command(name="tebakkata", description="Main tebak kata dari huruf yang diacak.")
 async def tebak_kata(interaction: discord.Interaction):
-    await record_game_and_quest(interaction, "Tebak Kata")
+    started = await record_game_and_quest(interaction, "Tebak Kata")
     kata_asli = random.choice(KATA_LIST)
     huruf_acak = ''.join(random.sample(kata_asli, len(kata_asli)))
 
@@ -594,21 +879,18 @@ async def tebak_kata(interaction: discord.Interaction):
         color=discord.Color.blue()
     )
     await interaction.response.send_message(embed=embed)
-
-    def check(m):
-        # Hanya cek pesan dari user yang menjalankan command di channel yang sama
-        return m.author == interaction.user and m.channel == interaction.channel
+    await announce_quest_completion(interaction, started['quest'])
 
     try:
-        msg = await bot.wait_for('message', check=check, timeout=30.0)
+        # Hanya pesan dari user yang menjalankan command di channel yang sama
+        msg = await bot.message_waiters.wait(interaction.channel_id, interaction.user.id, timeout=30.0)
         
         if msg.content.lower() == kata_asli:
-            # BUG FIX: Gunakan add_coins untuk transaksi atomik
-            await bot.db.add_coins(interaction.user.id, TEBAK_KATA_REWARD)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", TEBAK_KATA_REWARD)
+            # Hadiah + quest menang dalam satu transaksi
+            settled = await bot.db.settle_game(interaction.user.id, payout=TEBAK_KATA_REWARD)
             embed = discord.Embed(title="🎉 Benar Sekali!", description=f"Jawabannya adalah **{kata_asli}**.\nKamu mendapatkan **{TEBAK_KATA_REWARD}** koin!", color=discord.Color.green())
             await send_auto_delete(interaction, embed=embed, delay=10, ephemeral=False)
+            await announce_quest_completion(interaction, settled['quest'])
         else:
             embed = discord.Embed(title="❌ Salah!", description=f"Jawaban yang benar adalah **{kata_asli}**. Coba lagi lain kali!", color=discord.Color.red())
             await send_auto_delete(interaction, embed=embed, delay=10, ephemeral=False)
@@ -619,7 +901,7 @@ async def tebak_kata(interaction: discord.Interaction):
 
 @bot.tree.command(name="mathbattle", description="Selesaikan soal matematika dalam 10 detik!")
 async def math_battle(interaction: discord.Interaction):
-    await record_game_and_quest(interaction, "Math Battle")
+    started = await record_game_and_quest(interaction, "Math Battle")
     ops = ['+', '-']
     op = random.choice(ops)
     num1 = random.randint(10, 99)
@@ -632,20 +914,17 @@ async def math_battle(interaction: discord.Interaction):
 
     embed = discord.Embed(title="⚔️ Math Battle!", description=f"Berapa hasil dari **`{num1} {op} {num2}`**?\nWaktumu 10 detik!", color=discord.Color.blue())
     await interaction.response.send_message(embed=embed)
-
-    def check(m):
-        return m.author == interaction.user and m.channel == interaction.channel
+    await announce_quest_completion(interaction, started['quest'])
 
     try:
-        msg = await bot.wait_for('message', check=check, timeout=10.0)
+        msg = await bot.message_waiters.wait(interaction.channel_id, interaction.user.id, timeout=10.0)
         
         if int(msg.content) == jawaban:
-            # BUG FIX: Gunakan add_coins untuk transaksi atomik
-            await bot.db.add_coins(interaction.user.id, MATH_BATTLE_REWARD)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", MATH_BATTLE_REWARD)
+            # Hadiah + quest menang dalam satu transaksi
+            settled = await bot.db.settle_game(interaction.user.id, payout=MATH_BATTLE_REWARD)
             embed = discord.Embed(title="🧠 Cerdas!", description=f"Jawabannya **{jawaban}**.\nKamu dapat **{MATH_BATTLE_REWARD}** koin!", color=discord.Color.green())
             await send_auto_delete(interaction, embed=embed, delay=10, ephemeral=False)
+            await announce_quest_completion(interaction, settled['quest'])
         else:
             embed = discord.Embed(title="❌ Salah!", description=f"Jawaban yang benar adalah **{jawaban}**.", color=discord.Color.red())
             await send_auto_delete(interaction, embed=embed, delay=10, ephemeral=False)
@@ -659,28 +938,25 @@ async def math_battle(interaction: discord.Interaction):
 
 @bot.tree.command(name="higherlower", description="Tebak angka rahasia antara 1-100.")
 async def higher_lower(interaction: discord.Interaction):
-    await record_game_and_quest(interaction, "Higher Lower")
+    started = await record_game_and_quest(interaction, "Higher Lower")
     angka_rahasia = random.randint(1, 100)
     kesempatan = 5
 
     embed = discord.Embed(title="🤔 Higher or Lower", description=f"Aku telah memilih angka antara 1 dan 100.\nKamu punya **{kesempatan}** kesempatan untuk menebaknya!", color=discord.Color.blue())
     await interaction.response.send_message(embed=embed)
-
-    def check(m):
-        return m.author == interaction.user and m.channel == interaction.channel
+    await announce_quest_completion(interaction, started['quest'])
 
     for i in range(kesempatan):
         try:
-            msg = await bot.wait_for('message', check=check, timeout=50.0)
+            msg = await bot.message_waiters.wait(interaction.channel_id, interaction.user.id, timeout=50.0)
             tebakan = int(msg.content)
 
             if tebakan == angka_rahasia:
-                # BUG FIX: Gunakan add_coins untuk transaksi atomik
-                await bot.db.add_coins(interaction.user.id, HIGHER_LOWER_REWARD)
-                await check_quest_completion(interaction, "win_game", 1)
-                await check_quest_completion(interaction, "earn_coins", HIGHER_LOWER_REWARD)
+                # Hadiah + quest menang dalam satu transaksi
+                settled = await bot.db.settle_game(interaction.user.id, payout=HIGHER_LOWER_REWARD)
                 embed = discord.Embed(title="🏆 HEBAT!", description=f"Kamu berhasil menebak angkanya, yaitu **{angka_rahasia}**!\nKamu memenangkan **{HIGHER_LOWER_REWARD}** koin!", color=discord.Color.green())
                 await send_auto_delete(interaction, embed=embed, delay=15, ephemeral=False)
+                await announce_quest_completion(interaction, settled['quest'])
                 return # Keluar dari fungsi jika sudah menang
             
             elif tebakan < angka_rahasia:
@@ -769,10 +1045,12 @@ class RPSBattleView(BaseGameView):
                 await self.message.edit(content=f"⚖️ **Seri!** Keduanya memilih **{p1_choice}**. Taruhan dikembalikan.", view=self)
 
     async def end_game(self, winner: discord.User, loser: discord.User, reason: str):
-        # BUG FIX: Gunakan add_coins untuk transfer atomik
-        await bot.db.add_coins(winner.id, self.bet)
-        await bot.db.add_coins(loser.id, -self.bet)
-        
+        # Transfer atomik dalam satu query: saldo yang kalah dicek dan dipindahkan sekaligus
+        if await bot.db.transfer(loser.id, winner.id, self.bet) is None:
+            embed = discord.Embed(title="⚔️ Hasil Pertandingan", description=f"{reason}\n\n{loser.mention} tidak punya cukup koin lagi untuk membayar taruhan. Taruhan dibatalkan.", color=discord.Color.red())
+            await self.message.edit(content=None, embed=embed, view=self)
+            return
+
         # Update Quest untuk pemenang (karena ini view, kita butuh interaction context, tapi self.message ada)
         # Kita tidak punya interaction object yang valid di sini untuk check_quest, jadi kita skip atau pakai trik lain.
         # Untuk simplifikasi, kita tidak update quest di PvP view ini karena kompleksitas context.
@@ -833,7 +1111,7 @@ class RPSChallengeView(BaseGameView):
             return
 
         # Catat statistik game
-        await record_game_and_quest(interaction, "Batu Gunting Kertas")
+        started = await record_game_and_quest(interaction, "Batu Gunting Kertas")
         # Note: Initiator quest progress is tricky here without their interaction, skipping for simplicity
 
         game_view = RPSBattleView(self.initiator, self.opponent, self.bet)
@@ -841,6 +1119,7 @@ class RPSChallengeView(BaseGameView):
         await interaction.response.edit_message(content=None, embed=embed, view=game_view)
         game_view.message = await interaction.original_response()
         self.stop()
+        await announce_quest_completion(interaction, started['quest'])
 
     @discord.ui.button(label="Tolak", style=discord.ButtonStyle.danger)
     async def decline(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1086,11 +1365,9 @@ class RiskTowerView(BaseGameView):
             self.current_reward = int(self.bet * multiplier)
             
             if self.level == self.max_level: # Mencapai puncak
-                # BUG FIX: Gunakan add_coins untuk memastikan saldo bertambah dengan benar
-                await bot.db.add_coins(self.author.id, self.current_reward)
-                await check_quest_completion(interaction, "win_game", 1)
-                await check_quest_completion(interaction, "earn_coins", self.current_reward)
+                settled = await bot.db.settle_game(self.author.id, payout=self.current_reward)
                 await self.end_game(interaction, f"🏆 LUAR BIASA! Kamu mencapai puncak dan memenangkan **{self.current_reward}** koin!")
+                await announce_quest_completion(interaction, settled['quest'])
             else: # Lanjut
                 button.disabled = False
                 embed = self.create_embed(f"Sukses mencapai lantai {self.level}! Lanjut atau cash out?")
@@ -1101,29 +1378,25 @@ class RiskTowerView(BaseGameView):
     @discord.ui.button(label="Cash Out", style=discord.ButtonStyle.success, emoji="💰")
     async def cashout(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.current_reward > 0:
-            # BUG FIX: Gunakan add_coins
-            await bot.db.add_coins(self.author.id, self.current_reward)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", self.current_reward)
+            settled = await bot.db.settle_game(self.author.id, payout=self.current_reward)
             await self.end_game(interaction, f"✅ Aman! Kamu berhasil cash out dan mendapatkan **{self.current_reward}** koin.")
+            await announce_quest_completion(interaction, settled['quest'])
         else:
             await self.end_game(interaction, "Kamu turun tanpa membawa apa-apa.")
 
 @game_group.command(name="risktower", description="Daki menara untuk hadiah besar, tapi hati-hati jangan sampai jatuh!")
 @app_commands.describe(taruhan="Jumlah koin yang ingin dipertaruhkan.")
 async def risk_tower(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
+    # Potong taruhan + catat permainan & quest dalam satu transaksi
+    started = await record_game_and_quest(interaction, "Risk Tower", taruhan)
+    if started is None:
         await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan ini!", delay=5)
         return
- 
-    # Langsung potong taruhan menggunakan add_coins (negatif) agar lebih aman
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Risk Tower")
 
     view = RiskTowerView(interaction.user, taruhan)
     embed = view.create_embed("Selamat datang di Risk Tower! Tekan 'Climb' untuk memulai.")
     await interaction.response.send_message(embed=embed, view=view)
+    await announce_quest_completion(interaction, started['quest'])
 
 
 ### GAME 2: ENERGY CORE
@@ -1189,11 +1462,9 @@ class EnergyCoreView(BaseGameView):
 
         if self.charge >= 100:
             reward = int(self.bet * self.multiplier)
-            # BUG FIX: Gunakan add_coins
-            await bot.db.add_coins(self.author.id, reward)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", reward)
+            settled = await bot.db.settle_game(self.author.id, payout=reward)
             await self.end_game(interaction, f"🔋 DAYA PENUH! Kamu berhasil mengumpulkan **{reward}** koin!")
+            await announce_quest_completion(interaction, settled['quest'])
         else:
             self.children[0].disabled = False
             self.children[1].disabled = False
@@ -1204,30 +1475,26 @@ class EnergyCoreView(BaseGameView):
     async def stop_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         reward = int(self.bet * self.multiplier)
         if reward > self.bet:
-            await bot.db.add_coins(self.author.id, reward) # BUG FIX: Gunakan add_coins
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", reward)
+            settled = await bot.db.settle_game(self.author.id, payout=reward)
             await self.end_game(interaction, f"✅ Berhasil! Kamu mengamankan inti dan mendapatkan **{reward}** koin.")
+            await announce_quest_completion(interaction, settled['quest'])
         else:
-            # Kembalikan bet jika tidak ada profit
-            user_data = await bot.db.get_user_data(self.author.id)
-            await bot.db.update_user_balance(self.author.id, user_data['coins'] + self.bet)
+            # Kembalikan bet jika tidak ada profit (bukan kemenangan)
+            await bot.db.settle_game(self.author.id, payout=self.bet, won=False)
             await self.end_game(interaction, "Kamu berhenti sebelum ada keuntungan. Taruhan dikembalikan.")
 
 @game_group.command(name="energycore", description="Isi daya inti untuk multiplier, tapi jangan sampai meledak!")
 @app_commands.describe(taruhan="Jumlah koin yang ingin dipertaruhkan.")
 async def energy_core(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
+    # Potong taruhan + catat permainan & quest dalam satu transaksi
+    started = await record_game_and_quest(interaction, "Energy Core", taruhan)
+    if started is None:
         await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan ini!", delay=5)
         return
- 
-    # BUG FIX: Gunakan add_coins untuk transaksi atomik
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Energy Core")
     view = EnergyCoreView(interaction.user, taruhan)
     embed = view.create_embed("Inti energi stabil. Tekan 'Charge' untuk memulai.")
     await interaction.response.send_message(embed=embed, view=view)
+    await announce_quest_completion(interaction, started['quest'])
 
 
 ### GAME 3: SHADOW DEAL
@@ -1276,12 +1543,10 @@ class ShadowDealView(BaseGameView):
             embed = discord.Embed(title="🎭 Shadow Deal", description=f"🔮 Sosok itu membuka kartumu...\n# **ZONK** 💀\nKamu kehilangan **{self.bet}** koin.", color=discord.Color.dark_grey())
             await interaction.edit_original_response(content=None, embed=embed)
         else:
-            # BUG FIX: Gunakan add_coins
-            await bot.db.add_coins(self.author.id, reward)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", reward)
+            settled = await bot.db.settle_game(self.author.id, payout=reward)
             embed = discord.Embed(title="🎭 Shadow Deal", description=f"🔮 Sosok itu membuka kartumu...\n# **JACKPOT** 💎\nKamu memenangkan **{reward}** koin!", color=discord.Color.purple())
             await interaction.edit_original_response(content=None, embed=embed)
+            await announce_quest_completion(interaction, settled['quest'])
         self.stop()
 
     @discord.ui.button(label="Kartu Pertama", style=discord.ButtonStyle.secondary, emoji="🃏")
@@ -1299,17 +1564,15 @@ class ShadowDealView(BaseGameView):
 @game_group.command(name="shadowdeal", description="Buat kesepakatan dengan bayangan, pilih satu dari tiga kartu.")
 @app_commands.describe(taruhan="Jumlah koin yang ingin dipertaruhkan.")
 async def shadow_deal(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
+    # Potong taruhan + catat permainan & quest dalam satu transaksi
+    started = await record_game_and_quest(interaction, "Shadow Deal", taruhan)
+    if started is None:
         await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan ini!", delay=5)
         return
- 
-    # BUG FIX: Gunakan add_coins untuk transaksi atomik
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Shadow Deal")
     view = ShadowDealView(interaction.user, taruhan)
     embed = discord.Embed(title="🎭 Shadow Deal", description=f"Sosok misterius muncul dari bayangan. Dia menawarimu sebuah permainan.\n\n\"Pilih satu dari tiga kartu ini,\" bisiknya. \"Nasibmu ada di tanganmu.\"\n\nKamu mempertaruhkan **{taruhan}** koin.", color=discord.Color.purple())
     await interaction.response.send_message(embed=embed, view=view)
+    await announce_quest_completion(interaction, started['quest'])
 
 
 ### GAME 5: UNO (MULTIPLAYER)
@@ -1540,16 +1803,14 @@ class UnoGameView(BaseGameView):
         # Cek Menang
         if len(self.game.hands[player.id]) == 0:
             # WINNER
-            # BUG FIX: Gunakan add_coins
-            await bot.db.add_coins(player.id, self.game.pot)
-            await check_quest_completion(interaction, "win_game", 1)
-            await check_quest_completion(interaction, "earn_coins", self.game.pot)
+            settled = await bot.db.settle_game(player.id, payout=self.game.pot)
             
             embed = discord.Embed(title="🏆 UNO WINNER!", description=f"Selamat {player.mention}! Kamu memenangkan permainan dan mengambil seluruh pot sebesar **{self.game.pot}** koin!", color=discord.Color.gold())
             await self.message.edit(content=None, embed=embed, view=None)
             self.stop()
             msg = await interaction.followup.send("Permainan selesai! Pesan ini akan hilang.", ephemeral=True)
             asyncio.create_task(self._delete_msg_after(msg, 3))
+            await announce_quest_completion(interaction, settled['quest'], player)
             return
 
         # Efek Spesial
@@ -1647,15 +1908,14 @@ class UnoGameView(BaseGameView):
 
         if len(self.game.players) == 1:
             winner = self.game.players[0]
-            # BUG FIX: Gunakan add_coins
-            await bot.db.add_coins(winner.id, self.game.pot)
             # Note: Winner via surrender also counts
-            # We can't easily trigger quest for winner here as we don't have their interaction
+            settled = await bot.db.settle_game(winner.id, payout=self.game.pot)
             
             embed = discord.Embed(title="🏆 UNO WINNER!", description=f"{removed_player.mention} menyerah!\nSelamat {winner.mention}! Kamu memenangkan permainan dan mengambil seluruh pot sebesar **{self.game.pot}** koin!", color=discord.Color.gold())
             await self.message.edit(content=None, embed=embed, view=None)
             self.stop()
             await send_auto_delete(interaction, "Kamu menyerah.", delay=3, ephemeral=True)
+            await announce_quest_completion(interaction, settled['quest'], winner)
             return
 
         self.game.last_action = f"{removed_player.mention} menyerah dan keluar."
@@ -1668,7 +1928,18 @@ class UnoLobbyView(BaseGameView):
         super().__init__(timeout=300)
         self.host = host
         self.bet = bet
+        # Taruhan baru dipotong saat game dimulai, jadi lobby yang batal/bot restart tidak menahan koin
         self.players = [host]
+        self.message = None
+        self.starting = False
+
+    async def on_timeout(self):
+        # Game tidak pernah dimulai: belum ada taruhan yang dipotong
+        if self.starting:
+            return
+        if self.message:
+            embed = discord.Embed(title="⏰ Waktu Habis", description="Lobby UNO dibatalkan. Tidak ada koin yang dipotong.", color=discord.Color.red())
+            await self.message.edit(embed=embed, view=None)
 
     @discord.ui.button(label="Join Game", style=discord.ButtonStyle.success)
     async def join(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1679,11 +1950,17 @@ class UnoLobbyView(BaseGameView):
             await interaction.response.send_message("Lobby penuh!", ephemeral=True)
             return
         
+        # Cek saldo awal saja, taruhan dipotong secara atomik saat game dimulai
         user_data = await bot.db.get_user_data(interaction.user.id)
         if user_data['coins'] < self.bet:
             await interaction.response.send_message(f"Koinmu tidak cukup! Butuh {self.bet} koin.", ephemeral=True)
             return
 
+        # Cek ulang setelah await: klik join bersamaan bisa membuat lobby penuh
+        if interaction.user in self.players or len(self.players) >= 4 or self.starting or self.is_finished():
+            await interaction.response.send_message("Lobby penuh!", ephemeral=True)
+            return
+
         self.players.append(interaction.user)
         await interaction.response.edit_message(embed=self.create_embed(), view=self)
 
@@ -1696,19 +1973,44 @@ class UnoLobbyView(BaseGameView):
         if len(self.players) < 2:
             await send_auto_delete(interaction, "Butuh minimal 2 pemain!", delay=3, ephemeral=True)
             return
+        if self.starting:
+            await send_auto_delete(interaction, "Game sedang dimulai...", delay=3, ephemeral=True)
+            return
 
-        # Potong saldo semua pemain
-        pot = 0
-        for p in self.players:
-            # BUG FIX: Gunakan add_coins untuk transaksi atomik
-            await bot.db.add_coins(p.id, -self.bet)
-            pot += self.bet
-            # Note: record_game_play called manually here, quest update tricky for all players
-            await bot.db.record_game_play(p.id, "UNO")
+        # Potong taruhan semua pemain. Jika satu gagal (saldo kurang/error), yang sudah dipotong
+        # dikembalikan dan lobby tetap terbuka; lobby baru dihentikan setelah semua berhasil.
+        self.starting = True
+        players = list(self.players)
+        debited = []
+        started = None
+        try:
+            for p in players:
+                if await bot.db.try_debit(p.id, self.bet) is None:
+                    break
+                debited.append(p)
+            else:
+                # Catat statistik & quest 'play_game' tiap pemain
+                started = [await bot.db.settle_game(p.id, "UNO") for p in players]
+        finally:
+            if started is None:
+                for p in debited:
+                    await bot.db.add_coins(p.id, self.bet)
+                self.starting = False
+        if started is None:
+            # Pemain (selain host) yang saldonya kurang dikeluarkan dari lobby
+            broke = players[len(debited)]
+            if broke.id != self.host.id and broke in self.players:
+                self.players.remove(broke)
+                await interaction.message.edit(embed=self.create_embed(), view=self)
+            await send_auto_delete(interaction, f"Koin {broke.mention} tidak cukup untuk taruhan {self.bet} koin. Game belum dimulai.", delay=5, ephemeral=True)
+            return
+
+        self.stop()
+        pot = self.bet * len(players)
 
         # Setup Game
         game = UnoGame()
-        game.players = self.players
+        game.players = players
         game.bet = self.bet
         game.pot = pot
         game.create_deck()
@@ -1731,6 +2033,8 @@ class UnoLobbyView(BaseGameView):
         first_player = game.players[game.turn_index]
         await interaction.response.edit_message(content=f"Game Dimulai! Giliran pertama: {first_player.mention}", embed=embed, view=game_view)
         game_view.message = await interaction.original_response()
+        for p, settled in zip(players, started):
+            await announce_quest_completion(interaction, settled['quest'], p)
 
 
     def create_embed(self):
@@ -1742,6 +2046,7 @@ class UnoLobbyView(BaseGameView):
 @game_group.command(name="uno", description="Mainkan UNO multiplayer dengan taruhan!")
 @app_commands.describe(taruhan="Jumlah koin untuk bergabung.")
 async def play_uno(interaction: discord.Interaction, taruhan: app_commands.Range[int, 10]):
+    # Cek saldo awal saja, taruhan host dipotong bersama pemain lain saat game dimulai
     user_data = await bot.db.get_user_data(interaction.user.id)
     if user_data['coins'] < taruhan:
         await send_auto_delete(interaction, "Koinmu tidak cukup untuk membuat lobby ini.", delay=5, ephemeral=True)
@@ -1749,6 +2054,7 @@ async def play_uno(interaction: discord.Interaction, taruhan: app_commands.Range
 
     view = UnoLobbyView(interaction.user, taruhan)
     await interaction.response.send_message(embed=view.create_embed(), view=view)
+    view.message = await interaction.original_response()
 
 ### GAME 4: SLOT MACHINE
 
@@ -1757,6 +2063,7 @@ class SlotMachineView(BaseGameView):
         super().__init__(timeout=180.0)
         self.author = author
         self.bet = bet
+        self.recorded = False  # Permainan dicatat (statistik & quest 'play_game') pada putaran pertama yang berhasil
         self.reels = ['❓', '❓', '❓']
         self.emojis = ['🍒', '🍋', '🍊', '🍇', '🔔', '💎', '💰', '🍀']
         # Payouts: {emoji: {count: multiplier}}
@@ -1798,27 +2105,9 @@ class SlotMachineView(BaseGameView):
         spin_button.disabled = True
         await interaction.edit_original_response(view=self)
 
-        user_data = await bot_instance.db.get_user_data(self.author.id)
-        if user_data['coins'] < self.bet:
-            for item in self.children: item.disabled = True
-            await interaction.edit_original_response(content="❌ Koinmu tidak cukup untuk memutar lagi.", embed=None, view=self)
-            self.stop()
-            return
-        
-        # Potong taruhan
-        await bot_instance.db.add_coins(self.author.id, -self.bet)
-        # Quest play_game updated in command, or here? Command is better for initial, but spin again?
-        # Let's update play_game quest here for re-spins
-        await bot_instance.db.record_game_play(self.author.id, "Slot Machine")
-
-        for _ in range(3):
-            self.reels = [random.choice(self.emojis) for _ in range(3)]
-            # Update tampilan saat berputar (Animasi)
-            embed = self.create_embed("🔄 Memutar...", 0)
-            await interaction.edit_original_response(embed=embed, view=self)
-            await asyncio.sleep(0.5)
-
-        counts = {emoji: self.reels.count(emoji) for emoji in set(self.reels)}
+        # Hasil akhir ditentukan dulu agar taruhan, hadiah, statistik & quest cukup satu transaksi
+        final_reels = [random.choice(self.emojis) for _ in range(3)]
+        counts = {emoji: final_reels.count(emoji) for emoji in set(final_reels)}
         win_amount = 0
         status = f"Kamu kalah dan kehilangan **{self.bet}** koin."
 
@@ -1831,18 +2120,32 @@ class SlotMachineView(BaseGameView):
             if multiplier > 0:
                 win_amount = int(self.bet * multiplier)
                 status = f"🎉 **JACKPOT!** Kamu memenangkan **{win_amount}** koin!"
-                # Tambahkan kemenangan
-                await bot_instance.db.add_coins(self.author.id, win_amount)
-                await check_quest_completion(interaction, "win_game", 1)
-                await check_quest_completion(interaction, "earn_coins", win_amount)
-        
-        # Ambil saldo terbaru untuk ditampilkan
-        updated_user_data = await bot_instance.db.get_user_data(self.author.id)
-        current_balance = updated_user_data['coins']
 
-        embed = self.create_embed(status, win_amount, current_balance)
+        # Potong taruhan (cek saldo), bayar kemenangan & quest. Permainan hanya dicatat pada putaran
+        # pertama yang taruhannya berhasil dipotong, re-spin tidak dihitung sebagai permainan baru
+        game_name = None if self.recorded else "Slot Machine"
+        self.recorded = True
+        settled = await bot_instance.db.settle_game(self.author.id, game_name, bet=self.bet, payout=win_amount)
+        if settled is None:
+            if game_name:
+                self.recorded = False
+            for item in self.children: item.disabled = True
+            await interaction.edit_original_response(content="❌ Koinmu tidak cukup untuk memutar lagi.", embed=None, view=self)
+            self.stop()
+            return
+
+        for frame in range(3):
+            # Frame terakhir menampilkan hasil akhir
+            self.reels = final_reels if frame == 2 else [random.choice(self.emojis) for _ in range(3)]
+            # Update tampilan saat berputar (Animasi)
+            embed = self.create_embed("🔄 Memutar...", 0)
+            await interaction.edit_original_response(embed=embed, view=self)
+            await asyncio.sleep(0.5)
+
+        embed = self.create_embed(status, win_amount, settled['coins'])
         spin_button.disabled = False
         await interaction.edit_original_response(embed=embed, view=self)
+        await announce_quest_completion(interaction, settled['quest'])
 
     @discord.ui.button(label="Putar Lagi", style=discord.ButtonStyle.primary, emoji="▶️")
     async def spin_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1857,13 +2160,9 @@ class SlotMachineView(BaseGameView):
 @game_group.command(name="slotmachine", description="Mainkan mesin slot dan menangkan hadiah besar!")
 @app_commands.describe(taruhan="Jumlah koin yang ingin dipertaruhkan per putaran.")
 async def slot_machine(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
-        await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan awal ini!", delay=5)
-        return
-    
+    # Saldo dicek secara atomik oleh settle_game di setiap putaran (spin_logic), permainan dicatat
+    # pada putaran pertama yang berhasil agar membuka mesin tanpa koin tidak menambah progres quest
     view = SlotMachineView(interaction.user, taruhan)
-    await record_game_and_quest(interaction, "Slot Machine")
     embed = view.create_embed("Selamat datang! Tekan 'Putar Lagi' untuk memulai permainan.")
     await interaction.response.send_message(embed=embed, view=view)
 
@@ -1873,30 +2172,25 @@ async def slot_machine(interaction: discord.Interaction, taruhan: app_commands.R
     tebakan="Tebakan angkamu dari 1 sampai 10."
 )
 async def guess_number(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1], tebakan: app_commands.Range[int, 1, 10]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
-        await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan ini!", delay=5)
-        return
-
-    # BUG FIX: Gunakan add_coins untuk transaksi atomik
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Tebak Angka")
-
     angka_bot = random.randint(1, 10)
     reward_multiplier = 5
     reward = taruhan * reward_multiplier
+    menang = tebakan == angka_bot
+
+    # Taruhan, hadiah, statistik & quest dalam satu transaksi
+    settled = await bot.db.settle_game(interaction.user.id, "Tebak Angka", bet=taruhan, payout=reward if menang else 0)
+    if settled is None:
+        await send_auto_delete(interaction, "❌ Koinmu tidak cukup untuk taruhan ini!", delay=5)
+        return
 
-    if tebakan == angka_bot:
-        # BUG FIX: Gunakan add_coins untuk menambahkan hadiah
-        await bot.db.add_coins(interaction.user.id, reward)
-        await check_quest_completion(interaction, "win_game", 1)
-        await check_quest_completion(interaction, "earn_coins", reward)
+    if menang:
         embed = discord.Embed(title="🎉 JACKPOT! 🎉", description=f"Tebakanmu **{tebakan}** benar! Angka rahasianya adalah **{angka_bot}**.\nKamu memenangkan **{reward}** koin!", color=discord.Color.green())
     else:
         # Kalah, taruhan sudah dipotong
         embed = discord.Embed(title="💥 ZONK! 💥", description=f"Tebakanmu **{tebakan}** salah. Angka rahasianya adalah **{angka_bot}**.\nKamu kehilangan **{taruhan}** koin.", color=discord.Color.red())
     
     await interaction.response.send_message(embed=embed)
+    await announce_quest_completion(interaction, settled['quest'])
 
 ### GAME 6: BLACKJACK
 
@@ -1983,17 +2277,17 @@ class BlackjackView(BaseGameView):
     async def end_game(self, interaction: discord.Interaction, result: str, payout_mult: float = 0):
         for item in self.children: item.disabled = True
         
+        settled = None
         if payout_mult > 0:
             # payout_mult 1.0 = balik modal (seri), 2.0 = menang 1x, 2.5 = blackjack
             payout = int(self.bet * payout_mult)
-            await bot.db.add_coins(self.author.id, payout)
-            if payout_mult > 1.0:
-                await check_quest_completion(interaction, "win_game", 1)
-                await check_quest_completion(interaction, "earn_coins", payout)
+            settled = await bot.db.settle_game(self.author.id, payout=payout, won=payout_mult > 1.0)
         
         embed = self.create_embed(result)
         await interaction.response.edit_message(embed=embed, view=self)
         self.stop()
+        if settled:
+            await announce_quest_completion(interaction, settled['quest'])
 
     @discord.ui.button(label="Hit", style=discord.ButtonStyle.primary)
     async def hit(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -2031,33 +2325,33 @@ class BlackjackView(BaseGameView):
 @game_group.command(name="blackjack", description="Main Blackjack (21) melawan dealer.")
 @app_commands.describe(taruhan="Jumlah koin yang ingin dipertaruhkan.")
 async def blackjack(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
-        await send_auto_delete(interaction, "❌ Koinmu tidak cukup!", delay=5)
-        return
-    
-    # Potong taruhan di awal
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Blackjack")
-    
     view = BlackjackView(interaction.user, taruhan)
-    
-    # Cek Instant Blackjack Player
+
+    # Cek Instant Blackjack Player (kartu sudah dibagi, jadi hasilnya bisa diselesaikan sekaligus)
+    payout, won = 0, False
     if view.calculate_score(view.player_hand) == 21:
         if view.calculate_score(view.dealer_hand) == 21:
-             await bot.db.add_coins(interaction.user.id, taruhan) # Refund
-             embed = view.create_embed("⚖️ Keduanya Blackjack! Seri.")
-             await interaction.response.send_message(embed=embed, view=None)
+             payout = taruhan # Refund
         else:
-             payout = int(taruhan * 2.5) # Menang 3:2
-             await bot.db.add_coins(interaction.user.id, payout)
-             await check_quest_completion(interaction, "win_game", 1)
-             await check_quest_completion(interaction, "earn_coins", payout)
-             embed = view.create_embed("🎉 BLACKJACK! Kamu menang 1.5x lipat!")
-             await interaction.response.send_message(embed=embed, view=None)
+             payout, won = int(taruhan * 2.5), True # Menang 3:2
+
+    # Potong taruhan (+ hadiah instan) + catat permainan & quest dalam satu transaksi
+    started = await bot.db.settle_game(interaction.user.id, "Blackjack", bet=taruhan, payout=payout, won=won)
+    if started is None:
+        view.stop()
+        await send_auto_delete(interaction, "❌ Koinmu tidak cukup!", delay=5)
         return
 
-    await interaction.response.send_message(embed=view.create_embed(), view=view)
+    if payout > 0:
+        view.stop()
+        if won:
+             embed = view.create_embed("🎉 BLACKJACK! Kamu menang 1.5x lipat!")
+        else:
+             embed = view.create_embed("⚖️ Keduanya Blackjack! Seri.")
+        await interaction.response.send_message(embed=embed, view=None)
+    else:
+        await interaction.response.send_message(embed=view.create_embed(), view=view)
+    await announce_quest_completion(interaction, started['quest'])
 
 ### GAME 7: BALAPAN (RACE)
 @game_group.command(name="balapan", description="Taruhan pada balapan hewan! Pilih jagoanmu.")
@@ -2072,15 +2366,12 @@ async def blackjack(interaction: discord.Interaction, taruhan: app_commands.Rang
     app_commands.Choice(name="4. 🐇 Kelinci", value=4)
 ])
 async def balapan(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1], jagoan: app_commands.Choice[int]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
+    # Potong taruhan + catat permainan & quest dalam satu transaksi
+    started = await record_game_and_quest(interaction, "Balapan", taruhan)
+    if started is None:
         await send_auto_delete(interaction, "❌ Koinmu tidak cukup!", delay=5)
         return
 
-    # Potong taruhan
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Balapan")
-
     runners = [
         {"emoji": "🐎", "name": "Kuda", "pos": 0},
         {"emoji": "🐕", "name": "Anjing", "pos": 0},
@@ -2093,6 +2384,7 @@ async def balapan(interaction: discord.Interaction, taruhan: app_commands.Range[
     embed = discord.Embed(title="🏁 Balapan Dimulai! 🏁", description="Para peserta bersiap di garis start...", color=discord.Color.gold())
     await interaction.response.send_message(embed=embed)
     msg = await interaction.original_response()
+    await announce_quest_completion(interaction, started['quest'])
     
     winner_idx = -1
     
@@ -2142,9 +2434,7 @@ async def balapan(interaction: discord.Interaction, taruhan: app_commands.Range[
     
     if user_choice_idx == winner_idx:
         winnings = taruhan * 3 # Menang 3x lipat (karena ada 4 peserta)
-        await bot.db.add_coins(interaction.user.id, winnings)
-        await check_quest_completion(interaction, "win_game", 1)
-        await check_quest_completion(interaction, "earn_coins", winnings)
+        settled = await bot.db.settle_game(interaction.user.id, payout=winnings)
         result_desc += f"🎉 **SELAMAT!** Pilihanmu tepat! Kamu memenangkan **{winnings}** koin!"
         color = discord.Color.green()
     else:
@@ -2153,6 +2443,8 @@ async def balapan(interaction: discord.Interaction, taruhan: app_commands.Range[
         
     embed = discord.Embed(title="🏁 Hasil Balapan 🏁", description=result_desc, color=color)
     await msg.edit(embed=embed)
+    if user_choice_idx == winner_idx:
+        await announce_quest_completion(interaction, settled['quest'])
 
 ### GAME 8: COINFLIP
 @game_group.command(name="coinflip", description="Lempar koin (Head/Tail). Peluang 50:50.")
@@ -2162,32 +2454,28 @@ async def balapan(interaction: discord.Interaction, taruhan: app_commands.Range[
     app_commands.Choice(name="🦅 Tail (Angka)", value="tail")
 ])
 async def coinflip(interaction: discord.Interaction, taruhan: app_commands.Range[int, 1], sisi: app_commands.Choice[str]):
-    user_data = await bot.db.get_user_data(interaction.user.id)
-    if user_data['coins'] < taruhan:
-        await send_auto_delete(interaction, "❌ Koinmu tidak cukup!", delay=5)
-        return
-
-    await bot.db.add_coins(interaction.user.id, -taruhan)
-    await record_game_and_quest(interaction, "Coinflip")
-    
     outcome = random.choice(["head", "tail"])
     outcome_name = "Head (Gambar) 🪙" if outcome == "head" else "Tail (Angka) 🦅"
+    winnings = int(taruhan * 1.95) if sisi.value == outcome else 0 # 1.95x payout
+
+    # Taruhan, hadiah, statistik & quest dalam satu transaksi
+    settled = await bot.db.settle_game(interaction.user.id, "Coinflip", bet=taruhan, payout=winnings)
+    if settled is None:
+        await send_auto_delete(interaction, "❌ Koinmu tidak cukup!", delay=5)
+        return
     
     # Animasi suspense sederhana
     embed = discord.Embed(title="🪙 Melempar Koin...", description="Koin sedang berputar di udara...", color=discord.Color.gold())
     await interaction.response.send_message(embed=embed)
     await asyncio.sleep(2)
     
-    if sisi.value == outcome:
-        winnings = int(taruhan * 1.95) # 1.95x payout
-        await bot.db.add_coins(interaction.user.id, winnings)
-        await check_quest_completion(interaction, "win_game", 1)
-        await check_quest_completion(interaction, "earn_coins", winnings)
+    if winnings:
         embed = discord.Embed(title="🪙 Coinflip", description=f"Koin mendarat di: **{outcome_name}**\n🎉 Kamu Menang **{winnings}** koin!", color=discord.Color.green())
     else:
         embed = discord.Embed(title="🪙 Coinflip", description=f"Koin mendarat di: **{outcome_name}**\n❌ Kamu Kalah **{taruhan}** koin.", color=discord.Color.red())
         
     await interaction.edit_original_response(embed=embed)
+    await announce_quest_completion(interaction, settled['quest'])
 
 @game_group.command(name="tictactoe", description="Main Tic-Tac-Toe (XOXO) melawan teman.")
 @app_commands.describe(lawan="Pemain yang ingin kamu tantang.")
@@ -2223,14 +2511,56 @@ async def give_coins(interaction: discord.Interaction, user: discord.User, amoun
         await send_auto_delete(interaction, "❌ Tidak bisa memberikan koin kepada bot.", delay=5)
         return
 
-    user_data = await bot.db.get_user_data(user.id)
-    new_balance = user_data['coins'] + amount
-    
-    await bot.db.update_user_balance(user.id, new_balance)
-    
+    # Selisih ditambahkan secara atomik di DB (bukan menulis saldo absolut dari hasil baca)
+    await bot.db.get_user_data(user.id)  # Pastikan baris user ada
+    new_balance = await bot.db.add_coins(user.id, amount)
+
     embed = discord.Embed(description=f"✅ Berhasil mengubah saldo {user.mention} sebesar `{amount}` koin.\nSaldo barunya sekarang adalah **{new_balance}** koin.", color=discord.Color.green())
     await send_auto_delete(interaction, embed=embed, delay=5)
 
+@admin_group.command(name="dbstats", description="Lihat statistik connection pool dan cache database.")
+async def db_stats(interaction: discord.Interaction):
+    if not await interaction.client.is_owner(interaction.user):
+        await interaction.response.send_message(f"🚨 **PERINGATAN** 🚨\n{interaction.user.mention} mencoba menggunakan perintah admin padahal bukan Owner! 🤨", ephemeral=False)
+        return
+
+    pool = bot.db.pool_stats()
+    embed = discord.Embed(title="🗄️ Statistik Database", color=discord.Color.blurple())
+    if 'size' in pool:
+        embed.add_field(name="🔌 Pool", value=f"Terpakai **{pool['in_use']}**/{pool['size']} (min {pool['min_size']}, max {pool['max_size']})", inline=False)
+        embed.add_field(name="⏳ Tunggu Acquire", value=f"Rata-rata **{pool['avg_wait_ms']:.2f}** ms\nMaks **{pool['max_wait_ms']:.1f}** ms\n{pool['acquires']:,} acquire", inline=True)
+        embed.add_field(name="⚡ Query", value=f"**{pool['queries_per_second']:.1f}**/detik\n{pool['query_count']:,} total", inline=True)
+    else:
+        embed.add_field(name="⚡ Query", value=f"{pool['query_count']:,} total", inline=True)
+
+    cache = bot.db.cache_stats()
+    if cache:
+        embed.add_field(name="🧠 Cache User", value=f"{cache['size']:,}/{cache['max_size']:,} user\nHit rate **{cache['hit_rate']:.1%}**", inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@admin_group.command(name="querystats", description="Lihat query database dengan total waktu terbesar sejak bot start.")
+@app_commands.describe(jumlah="Jumlah query yang ditampilkan (default 10)")
+async def query_stats(interaction: discord.Interaction, jumlah: app_commands.Range[int, 1, 25] = 10):
+    if not await interaction.client.is_owner(interaction.user):
+        await interaction.response.send_message(f"🚨 **PERINGATAN** 🚨\n{interaction.user.mention} mencoba menggunakan perintah admin padahal bukan Owner! 🤨", ephemeral=False)
+        return
+
+    queries = bot.db.query_stats(jumlah)
+    if not queries:
+        await interaction.response.send_message("📭 Belum ada statistik query (atau backend database tidak mencatatnya).", ephemeral=True)
+        return
+
+    lines = [f"{'Query':<22} {'Calls':>7} {'Total':>9} {'Avg':>8} {'Max':>8} {'Rows':>7} {'Wait':>8}"]
+    for q in queries:
+        avg_ms = q['total_seconds'] / q['calls'] * 1000
+        lines.append(
+            f"{q['name'][:22]:<22} {q['calls']:>7,} {q['total_seconds']:>8.2f}s {avg_ms:>6.1f}ms "
+            f"{q['max_seconds'] * 1000:>6.0f}ms {q['rows']:>7,} {q['wait_seconds']:>7.2f}s"
+        )
+    embed = discord.Embed(title="🐢 Query Database Terberat", description="```\n" + "\n".join(lines) + "\n```", color=discord.Color.blurple())
+    embed.set_footer(text="Total = waktu inklusif per method (termasuk tunggu pool) sejak bot start.")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 bot.tree.add_command(admin_group)
 
 # --- Fitur Fun & Interaksi ---
@@ -2253,21 +2583,23 @@ async def rate(interaction: discord.Interaction, target: str):
 
 @fun_group.command(name="meme", description="Lihat meme acak dari internet.")
 async def meme(interaction: discord.Interaction):
-    await interaction.response.defer()
-    # Menggunakan API publik meme-api.com
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://meme-api.com/gimme') as response:
-                if response.status == 200:
-                    data = await response.json()
-                    embed = discord.Embed(title=data['title'], url=data['postLink'], color=discord.Color.random())
-                    embed.set_image(url=data['url'])
-                    embed.set_footer(text=f"👍 {data['ups']} | Subreddit: r/{data['subreddit']}")
-                    await interaction.followup.send(embed=embed)
-                else:
-                    await interaction.followup.send("Gagal mengambil meme :( Coba lagi nanti.")
-    except Exception as e:
-        await interaction.followup.send(f"Terjadi kesalahan saat mengambil meme: {e}")
+    # Meme diambil dari antrean prefetch (meme-api.com), biasanya tanpa menunggu jaringan
+    data = bot.meme_buffer.get_nowait()
+    if data is None:
+        # Antrean kosong (baru start atau API bermasalah): tunggu sebentar sambil defer
+        await interaction.response.defer()
+        data = await bot.meme_buffer.get(timeout=5.0)
+        if data is None:
+            await interaction.followup.send("Gagal mengambil meme :( Coba lagi nanti.")
+            return
+
+    embed = discord.Embed(title=data['title'], url=data['postLink'], color=discord.Color.random())
+    embed.set_image(url=data['url'])
+    embed.set_footer(text=f"👍 {data.get('ups', 0)} | Subreddit: r/{data.get('subreddit', '-')}")
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed)
+    else:
+        await interaction.response.send_message(embed=embed)
 
 @fun_group.command(name="avatar", description="Lihat avatar pengguna secara full HD.")
 async def avatar(interaction: discord.Interaction, user: discord.User = None):
@@ -2575,37 +2907,17 @@ async def leaderboard(interaction: discord.Interaction, kategori: app_commands.C
     # Default scope ke global jika tidak dipilih
     scope_value = scope.value if scope else "global"
     
-    user_ids_filter = None
+    guild_id_filter = None
     if scope_value == "server":
         if not interaction.guild:
             await interaction.followup.send("❌ Leaderboard server hanya bisa digunakan di dalam server.")
             return
-        
-        # LOGIKA BARU: Cek kelengkapan cache member
-        # Jika jumlah member di cache lebih sedikit dari total member server, kita fetch ulang
-        current_cache_count = len(interaction.guild.members)
-        server_member_count = interaction.guild.member_count or current_cache_count
-        members = interaction.guild.members
-        
-        if server_member_count > current_cache_count:
-            try:
-                print(f"🔄 Cache member tidak lengkap ({current_cache_count}/{server_member_count}). Fetching dari API...", flush=True)
-                members = [m async for m in interaction.guild.fetch_members(limit=None)]
-                print(f"✅ Berhasil fetch {len(members)} member.", flush=True)
-            except discord.Forbidden:
-                await interaction.followup.send("⚠️ **Error:** Bot tidak diizinkan membaca daftar member.\n👉 Aktifkan **Server Members Intent** di Discord Developer Portal.")
-                return
-            except Exception as e:
-                print(f"⚠️ Gagal fetch member: {e}")
-                # Lanjut dengan cache yang ada
 
-        user_ids_filter = [member.id for member in members if not member.bot]
-        
-        if not user_ids_filter:
-             await interaction.followup.send("⚠️ **Info:** Tidak ditemukan member manusia di server ini (atau Intent belum aktif).")
-             return
+        # Keanggotaan server dibaca dari tabel guild_members (diisi dari event join/leave + backfill),
+        # jadi tidak perlu fetch seluruh member dari API di setiap pemanggilan.
+        guild_id_filter = interaction.guild.id
 
-    leaderboard_data = await bot.db.get_leaderboard(sort_by=kategori.value, limit=10, user_ids=user_ids_filter)
+    leaderboard_data = await bot.db.get_leaderboard(sort_by=kategori.value, limit=10, guild_id=guild_id_filter)
 
     if not leaderboard_data:
         msg = "Belum ada data untuk ditampilkan di papan peringkat."
@@ -2715,36 +3027,36 @@ async def pay(interaction: discord.Interaction, user: discord.User, amount: app_
         await send_auto_delete(interaction, "❌ Kamu tidak bisa mentransfer koin ke bot!", delay=5)
         return
 
-    giver_data = await bot.db.get_user_data(giver.id)
-    
-    if giver_data['coins'] < amount:
+    # --- Proses Transfer (satu query atomik, cek saldo sudah termasuk) ---
+    result = await bot.db.transfer(giver.id, receiver.id, amount)
+
+    if result is None:
+        giver_data = await bot.db.get_user_data(giver.id)
         await send_auto_delete(interaction, f"❌ Koinmu tidak cukup! Kamu hanya punya {giver_data['coins']} koin.", delay=5)
         return
 
-    # --- Proses Transfer (BUG FIX: Gunakan add_coins) ---
-    await bot.db.add_coins(giver.id, -amount)
-    await bot.db.add_coins(receiver.id, amount)
+    giver_balance, _ = result
 
     # --- Konfirmasi ---
     embed = discord.Embed(title="💸 Transfer Berhasil", description=f"Kamu berhasil mentransfer **{amount}** koin kepada {receiver.mention}.", color=discord.Color.green())
+    embed.add_field(name="Sisa Saldomu", value=f"**{giver_balance:,}** 💰", inline=True)
     await interaction.response.send_message(embed=embed)
 
 if __name__ ==  "__main__":
     if TOKEN and DATABASE_URL:
 
-        print(f"🐍 Python: {sys.version.split()[0]}")
-        print(f"🤖 Discord.py: {discord.__version__}")
-        print("🔄 Memulai sistem...", flush=True)
+        log.info(f"🐍 Python: {sys.version.split()[0]}")
+        log.info(f"🤖 Discord.py: {discord.__version__}")
+        log.info("🔄 Memulai sistem...")
         try:
-            keep_alive()
-            print("✅ Web Server berjalan (Cek keep_alive.py untuk info port).", flush=True)
-            print("🚀 Sedang login ke Discord...", flush=True)
-            bot.run(TOKEN)
+            log.info("🚀 Sedang login ke Discord...")
+            # log_handler=None: discord.py tidak memasang handler sendiri, log-nya ikut pipeline setup_logging
+            bot.run(TOKEN, log_handler=None)
         except discord.errors.PrivilegedIntentsRequired:
-             logging.critical("❌ ERROR INTENTS: Mohon aktifkan 'Message Content Intent' dan 'Server Members Intent' di Discord Developer Portal.")
+             log.critical("❌ ERROR INTENTS: Mohon aktifkan 'Message Content Intent' dan 'Server Members Intent' di Discord Developer Portal.")
         except discord.errors.LoginFailure:
-             logging.critical("❌ ERROR TOKEN: Token bot tidak valid. Cek file .env.")
+             log.critical("❌ ERROR TOKEN: Token bot tidak valid. Cek file .env.")
         except Exception as e:
-            logging.critical(f"❌ BOT CRASH: {e}")
+            log.exception(f"❌ BOT CRASH: {e}")
     else:
-        print("Error: Pastikan DISCORD_TOKEN dan DATABASE_URL sudah diatur di file .env")
\ No newline at end of file
+        log.critical("❌ Pastikan DISCORD_TOKEN dan DATABASE_URL sudah diatur di file .env")
\ No newline at end of file
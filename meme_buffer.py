@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+class MemeBuffer:
+    """
+    Antrean meme yang diambil lebih dulu (prefetch) dari meme API agar /fun meme bisa langsung menjawab.
+    Background task mengisi ulang antrean setiap kali ada meme yang dipakai, meme dengan postLink
+    yang sudah pernah diambil (masih di antrean atau baru saja dikirim) dibuang.
+    """
+
+    def __init__(self, api_url: str = "https://meme-api.com", size: int = 20, batch: int = 10, seen_size: int = 1000):
+        """
+        :param api_url: Base URL meme API (endpoint /gimme/<jumlah>), bisa diarahkan ke meme_stub.py.
+        :param size: Jumlah maksimal meme di antrean.
+        :param batch: Jumlah meme per request ke API.
+        :param seen_size: Jumlah postLink terakhir yang diingat untuk membuang duplikat.
+        """
+        self.api_url = api_url.rstrip('/')
+        self.size = size
+        self.batch = batch
+        self.seen_size = seen_size
+        self._queue = asyncio.Queue(maxsize=size)
+        self._seen = OrderedDict()  # {postLink: None}, LRU
+        self._refill = asyncio.Event()
+        self._session = None
+        self._task = None
+        self.duplicates = 0
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self, session: aiohttp.ClientSession):
+        """Mulai background task pengisi antrean memakai session HTTP milik bot."""
+        self._session = session
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_nowait(self):
+        """Ambil satu meme tanpa menunggu jaringan. None jika antrean sedang kosong."""
+        try:
+            meme = self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+        self._refill.set()
+        return meme
+
+    async def get(self, timeout: float = 5.0):
+        """Ambil satu meme, tunggu maksimal `timeout` detik jika antrean kosong. None jika tetap kosong."""
+        self._refill.set()
+        try:
+            meme = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._refill.set()
+        return meme
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            if self._queue.full():
+                self._refill.clear()
+                await self._refill.wait()
+                continue
+            try:
+                added = await self._fetch()
+                backoff = 1.0
+            except Exception as e:
+                log.warning(f"⚠️ Gagal mengambil meme dari {self.api_url}: {e}")
+                added = None
+            if not added:
+                # API error atau hanya mengembalikan duplikat: tunggu sebelum mencoba lagi
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def _fetch(self) -> int:
+        """Ambil satu batch meme, masukkan yang belum pernah dilihat. Return jumlah yang masuk antrean."""
+        count = min(self.batch, self.size - self._queue.qsize())
+        async with self._session.get(f"{self.api_url}/gimme/{count}") as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        added = 0
+        # /gimme/<n> mengembalikan {"memes": [...]}, /gimme mengembalikan satu meme
+        for meme in data.get('memes', [data]):
+            link = meme.get('postLink')
+            if not link or not meme.get('url'):
+                continue
+            if link in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen[link] = None
+            while len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+            if self._queue.full():
+                break
+            self._queue.put_nowait(meme)
+            added += 1
+        return added
@@ -0,0 +1,80 @@
+"""
+Stub lokal meme API (format meme-api.com) untuk mencoba /fun meme dan MemeBuffer tanpa internet.
+
+Contoh:
+    python meme_stub.py --port 8765 --latency-ms 300
+    MEME_API_URL=http://localhost:8765 python main.py
+
+Endpoint: /gimme (satu meme) dan /gimme/<jumlah> ({"count": n, "memes": [...]}).
+Sebagian postLink sengaja diulang (--duplicate-rate) untuk menguji pembuangan duplikat.
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+
+def make_meme(number: int):
+    return {
+        'postLink': f"https://redd.it/stub{number}",
+        'subreddit': 'stub',
+        'title': f"Meme stub #{number}",
+        'url': f"https://i.redd.it/stub{number}.png",
+        'nsfw': False,
+        'spoiler': False,
+        'author': 'meme_stub',
+        'ups': random.randint(0, 50000),
+        'preview': [],
+    }
+
+
+def create_app(latency: float = 0.0, duplicate_rate: float = 0.2, fail_rate: float = 0.0):
+    """
+    :param latency: Jeda buatan (detik) per request, meniru round trip ke meme-api.com.
+    :param duplicate_rate: Peluang sebuah meme memakai postLink yang sudah pernah dikirim.
+    :param fail_rate: Peluang request dijawab HTTP 503.
+    """
+    state = {'next': 1, 'requests': 0}
+
+    def next_meme():
+        if state['next'] > 1 and random.random() < duplicate_rate:
+            return make_meme(random.randint(1, state['next'] - 1))
+        meme = make_meme(state['next'])
+        state['next'] += 1
+        return meme
+
+    async def gimme(request):
+        state['requests'] += 1
+        await asyncio.sleep(latency)
+        if random.random() < fail_rate:
+            return web.json_response({'code': 503, 'message': 'stub: gagal buatan'}, status=503)
+        count = request.match_info.get('count')
+        if count is None:
+            return web.json_response(next_meme())
+        memes = [next_meme() for _ in range(max(1, min(int(count), 50)))]
+        return web.json_response({'count': len(memes), 'memes': memes})
+
+    async def stats(request):
+        return web.json_response({'requests': state['requests'], 'memes_created': state['next'] - 1})
+
+    app = web.Application()
+    app.router.add_get('/gimme', gimme)
+    app.router.add_get(r'/gimme/{count:\d+}', gimme)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stub lokal meme API untuk /fun meme.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Jeda buatan per request")
+    parser.add_argument('--duplicate-rate', type=float, default=0.2, help="Peluang postLink duplikat (0-1)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Peluang request gagal 503 (0-1)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"🐸 Meme stub berjalan di http://localhost:{args.port} (MEME_API_URL=http://localhost:{args.port})")
+    web.run_app(create_app(args.latency_ms / 1000, args.duplicate_rate, args.fail_rate), port=args.port, print=None)
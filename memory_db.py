@@ -0,0 +1,337 @@
+import asyncio
+import datetime
+import logging
+from urllib.parse import urlparse, parse_qs
+
+from database import STARTING_COINS, LEADERBOARD_CATEGORIES
+
+log = logging.getLogger(__name__)
+
+
+class MemoryDatabaseManager:
+    """
+    Backend database di memori dengan method & semantik yang sama seperti DatabaseManager.
+    Dipakai untuk test dan benchmark offline tanpa PostgreSQL (DSN: memory://).
+    Setiap method menghitung jumlah round trip yang akan dilakukan versi PostgreSQL,
+    dan bisa diberi latensi buatan per round trip (memory://?latency_ms=2).
+    """
+
+    def __init__(self, dsn: str = "memory://", **options):
+        """
+        :param dsn: DSN dengan skema memory://, opsi latency_ms di query string.
+        :param options: Opsi DatabaseManager lain (cache, prepared statement) diterima tapi diabaikan.
+        """
+        self.dsn = dsn
+        query = parse_qs(urlparse(dsn).query)
+        try:
+            self.latency = float(query.get('latency_ms', ['0'])[0]) / 1000
+        except ValueError:
+            self.latency = 0.0
+        self.query_count = 0
+        self._users = {}         # {user_id: baris economy}
+        self._game_stats = {}    # {(user_id, game_name): baris game_stats}
+        self._quests = {}        # {user_id: baris active_quests}
+        self._guild_members = {} # {guild_id: set(user_id)}
+
+    async def _roundtrip(self, queries: int = 1):
+        """Simulasi round trip ke database (tetap memberi kesempatan task lain berjalan)."""
+        self.query_count += queries
+        await asyncio.sleep(self.latency * queries)
+
+    def _row(self, user_id: int):
+        """Ambil baris user, buat dengan nilai default jika belum ada."""
+        row = self._users.get(user_id)
+        if row is None:
+            row = {
+                'user_id': user_id, 'coins': STARTING_COINS, 'last_daily': None, 'birthday': None,
+                'level': 1, 'xp': 0, 'reputation': 0, 'last_rep_time': None, 'last_xp_time': None,
+            }
+            self._users[user_id] = row
+        return row
+
+    @staticmethod
+    def _level_up(row, gain: int):
+        """Rumus level bot (sama dengan XP_LEVEL_UP_SET): naik satu level jika xp >= level * 100."""
+        old_level = row['level']
+        xp = row['xp'] + gain
+        if xp >= old_level * 100:
+            row['xp'] = xp - old_level * 100
+            row['level'] = old_level + 1
+        else:
+            row['xp'] = xp
+        return {'user_id': row['user_id'], 'old_level': old_level, 'new_level': row['level'], 'xp': row['xp']}
+
+    # --- Siklus hidup ---
+
+    async def connect(self):
+        log.info(f"✅ Memakai database in-memory (latensi simulasi {self.latency * 1000:.1f} ms).")
+
+    async def close(self):
+        log.info("🔌 Database in-memory ditutup.")
+
+    async def init_db(self):
+        await self._roundtrip()
+
+    async def warmup(self):
+        pass
+
+    async def ping(self):
+        await self._roundtrip()
+
+    def query_stats(self, limit: int = None):
+        return []
+
+    def cache_stats(self):
+        return None
+
+    def pool_stats(self):
+        return {'query_count': self.query_count}
+
+    # --- Economy ---
+
+    async def get_user_data(self, user_id: int):
+        await self._roundtrip()
+        return dict(self._row(user_id))
+
+    async def update_user_balance(self, user_id: int, coins: int, last_daily: datetime.datetime = None):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row:
+            row['coins'] = coins
+            if last_daily:
+                row['last_daily'] = last_daily
+
+    async def add_coins(self, user_id: int, amount: int):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row is None:
+            return None
+        row['coins'] += amount
+        return row['coins']
+
+    async def try_debit(self, user_id: int, amount: int):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row is None:
+            # Versi PostgreSQL: baris baru hanya dibuat jika saldo awal cukup (satu statement)
+            if STARTING_COINS < amount:
+                return None
+            row = self._row(user_id)
+        if row['coins'] < amount:
+            return None
+        row['coins'] -= amount
+        return row['coins']
+
+    async def transfer(self, from_id: int, to_id: int, amount: int):
+        if from_id == to_id:
+            raise ValueError("Tidak bisa transfer ke diri sendiri")
+        # BEGIN + kunci baris + statement transfer + COMMIT
+        await self._roundtrip(4)
+        sender = self._users.get(from_id)
+        if sender is None:
+            # get_user_data lalu ulangi transaksi transfer
+            await self._roundtrip(5)
+            sender = self._row(from_id)
+        if sender['coins'] < amount:
+            return None
+        sender['coins'] -= amount
+        receiver = self._row(to_id)
+        receiver['coins'] += amount
+        return sender['coins'], receiver['coins']
+
+    async def process_daily_claim(self, user_id: int, reward: int, claim_time: datetime.datetime):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row:
+            row['coins'] += reward
+            row['last_daily'] = claim_time
+
+    async def set_birthday(self, user_id: int, birthday_str: str):
+        await self._roundtrip()
+        self._row(user_id)['birthday'] = birthday_str
+
+    async def get_birthdays_today(self, today_str: str):
+        await self._roundtrip()
+        return [{'user_id': row['user_id']} for row in self._users.values() if row['birthday'] == today_str]
+
+    async def pay_birthday_rewards(self, today_str: str, reward: int, user_ids: list):
+        if not user_ids:
+            return []
+        await self._roundtrip()
+        rows = []
+        for user_id in user_ids:
+            row = self._users.get(user_id)
+            if row is not None and row['birthday'] == today_str:
+                row['coins'] += reward
+                rows.append({'user_id': row['user_id'], 'coins': row['coins']})
+        return rows
+
+    # --- Leveling & reputasi ---
+
+    async def grant_xp(self, user_id: int, xp_to_add: int):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row is None:
+            await self._roundtrip(2)
+            row = self._row(user_id)
+        row['last_xp_time'] = datetime.datetime.now(datetime.timezone.utc)
+        return self._level_up(row, xp_to_add)
+
+    async def grant_xp_bulk(self, grants: dict):
+        if not grants:
+            return []
+        await self._roundtrip(2)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        rows = []
+        for user_id, gain in grants.items():
+            row = self._row(user_id)
+            row['last_xp_time'] = now
+            rows.append(self._level_up(row, gain))
+        return rows
+
+    async def update_level(self, user_id: int, new_level: int, new_xp: int):
+        await self._roundtrip()
+        row = self._users.get(user_id)
+        if row:
+            row['level'], row['xp'] = new_level, new_xp
+
+    async def give_reputation(self, giver_id: int, receiver_id: int):
+        await self._roundtrip(2)
+        receiver = self._users.get(receiver_id)
+        if receiver:
+            receiver['reputation'] += 1
+        giver = self._users.get(giver_id)
+        if giver:
+            giver['last_rep_time'] = datetime.datetime.now(datetime.timezone.utc)
+
+    # --- Keanggotaan server & leaderboard ---
+
+    async def add_guild_member(self, guild_id: int, user_id: int):
+        await self._roundtrip()
+        self._guild_members.setdefault(guild_id, set()).add(user_id)
+
+    async def remove_guild_member(self, guild_id: int, user_id: int):
+        await self._roundtrip()
+        self._guild_members.get(guild_id, set()).discard(user_id)
+
+    async def remove_guild(self, guild_id: int):
+        await self._roundtrip()
+        self._guild_members.pop(guild_id, None)
+
+    async def sync_guild_members(self, guild_id: int, user_ids: list):
+        await self._roundtrip(2)
+        self._guild_members[guild_id] = set(user_ids)
+
+    async def get_leaderboard(self, sort_by: str = 'coins', limit: int = 10, guild_id: int = None):
+        if sort_by not in LEADERBOARD_CATEGORIES:
+            sort_by = 'coins'
+        await self._roundtrip()
+        rows = self._users.values()
+        if guild_id is not None:
+            members = self._guild_members.get(guild_id, set())
+            rows = [row for row in rows if row['user_id'] in members]
+        top = sorted(rows, key=lambda row: row[sort_by], reverse=True)[:limit]
+        return [{'user_id': row['user_id'], sort_by: row[sort_by]} for row in top]
+
+    # --- Statistik game & quest ---
+
+    def _record_game_play(self, user_id: int, game_name: str):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        stats = self._game_stats.get((user_id, game_name))
+        if stats is None:
+            self._game_stats[(user_id, game_name)] = {
+                'game_name': game_name, 'total_plays': 1, 'weekly_plays': 1, 'last_played': now,
+            }
+            return
+        stats['total_plays'] += 1
+        # Reset mingguan: minggu ISO (UTC) yang sama dengan terakhir main
+        if stats['last_played'].isocalendar()[:2] == now.isocalendar()[:2]:
+            stats['weekly_plays'] += 1
+        else:
+            stats['weekly_plays'] = 1
+        stats['last_played'] = now
+
+    async def record_game_play(self, user_id: int, game_name: str):
+        await self._roundtrip()
+        self._record_game_play(user_id, game_name)
+
+    async def get_game_stats(self, user_id: int):
+        await self._roundtrip()
+        stats = [
+            {'game_name': s['game_name'], 'total_plays': s['total_plays'], 'weekly_plays': s['weekly_plays']}
+            for (uid, _), s in self._game_stats.items() if uid == user_id
+        ]
+        return sorted(stats, key=lambda s: s['total_plays'], reverse=True)
+
+    async def get_active_quest(self, user_id: int):
+        await self._roundtrip()
+        quest = self._quests.get(user_id)
+        return dict(quest) if quest else None
+
+    async def create_quest(self, user_id: int, quest_type: str, target: int, reward: int, difficulty: str):
+        await self._roundtrip()
+        self._quests[user_id] = {
+            'user_id': user_id, 'quest_type': quest_type, 'target': target, 'progress': 0,
+            'reward': reward, 'difficulty': difficulty, 'created_at': datetime.datetime.now(datetime.timezone.utc),
+        }
+
+    def has_active_quest(self, user_id: int, quest_type: str) -> bool:
+        quest = self._quests.get(user_id)
+        return quest is not None and quest['quest_type'] == quest_type
+
+    def _advance_quest(self, user_id: int, quest_type: str, amount: int):
+        """Tambah progress quest; selesaikan + bayar reward jika target tercapai. Return quest jika selesai."""
+        quest = self._quests[user_id]
+        new_progress = quest['progress'] + amount
+        if new_progress < quest['target']:
+            quest['progress'] = new_progress
+            return None
+        del self._quests[user_id]
+        row = self._users.get(user_id)
+        coins = None
+        if row:
+            row['coins'] += quest['reward']
+            coins = row['coins']
+        return dict(quest, new_progress=new_progress, completed=True, coins=coins)
+
+    async def update_quest_progress(self, user_id: int, quest_type: str, amount: int = 1):
+        # Sama seperti DatabaseManager: user tanpa quest tidak butuh query
+        if not self.has_active_quest(user_id, quest_type):
+            return None
+        await self._roundtrip()
+        return self._advance_quest(user_id, quest_type, amount)
+
+    async def settle_game(self, user_id: int, game_name: str = None, bet: int = 0, payout: int = 0, won: bool = None):
+        if won is None:
+            won = payout > 0
+
+        quest = self._quests.get(user_id)
+        quest_type = quest['quest_type'] if quest else None
+        quest_amount = {
+            'play_game': 1 if game_name else 0,
+            'win_game': 1 if won else 0,
+            'earn_coins': payout if won else 0,
+        }.get(quest_type, 0)
+
+        # Semua perubahan dilakukan tanpa await di tengahnya agar atomik seperti transaksi,
+        # round trip dihitung sama dengan versi PostgreSQL (BEGIN/COMMIT + statement)
+        queries = 2
+        row = self._users.get(user_id)
+        if bet > 0:
+            queries += 1
+            if row is None:
+                queries += 2
+            row = self._row(user_id)
+            if row['coins'] < bet:
+                await self._roundtrip(queries)
+                return None
+
+        row = self._row(user_id)
+        row['coins'] += payout - bet
+        if game_name:
+            self._record_game_play(user_id, game_name)
+        completed = self._advance_quest(user_id, quest_type, quest_amount) if quest_amount > 0 else None
+
+        queries += (payout > 0 or bet <= 0) + bool(game_name) + (quest_amount > 0)
+        await self._roundtrip(queries)
+        return {'coins': row['coins'], 'quest': completed}
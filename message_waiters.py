@@ -0,0 +1,81 @@
+import asyncio
+import heapq
+import itertools
+
+
+class MessageWaiters:
+    """
+    Pengganti bot.wait_for('message', check=...) untuk game jawaban chat.
+    Penunggu diindeks per (channel_id, user_id) sehingga setiap pesan cukup satu lookup dict,
+    bukan menjalankan semua check game yang sedang berjalan. Timeout diatur terpusat:
+    satu timer untuk deadline terdekat, bukan satu timer per penunggu.
+    """
+
+    def __init__(self):
+        self._waiters = {}     # {(channel_id, user_id): [future, ...]}
+        self._deadlines = []   # heap (deadline, urutan, key, future)
+        self._counter = itertools.count()
+        self._timer = None
+        self._timer_deadline = None
+
+    def __len__(self):
+        return sum(len(futures) for futures in self._waiters.values())
+
+    async def wait(self, channel_id: int, user_id: int, timeout: float):
+        """
+        Tunggu pesan berikutnya dari user di channel tersebut.
+        :raises asyncio.TimeoutError: Jika tidak ada pesan dalam `timeout` detik.
+        """
+        loop = asyncio.get_running_loop()
+        key = (channel_id, user_id)
+        future = loop.create_future()
+        self._waiters.setdefault(key, []).append(future)
+
+        deadline = loop.time() + timeout
+        heapq.heappush(self._deadlines, (deadline, next(self._counter), key, future))
+        if self._timer_deadline is None or deadline < self._timer_deadline:
+            self._arm(loop, deadline)
+
+        try:
+            return await future
+        finally:
+            self._discard(key, future)
+
+    def dispatch(self, message) -> bool:
+        """Serahkan pesan ke game yang menunggunya. Return True jika pesan dipakai sebagai jawaban."""
+        futures = self._waiters.pop((message.channel.id, message.author.id), None)
+        if not futures:
+            return False
+        consumed = False
+        for future in futures:
+            if not future.done():
+                future.set_result(message)
+                consumed = True
+        return consumed
+
+    def _discard(self, key, future):
+        futures = self._waiters.get(key)
+        if futures and future in futures:
+            futures.remove(future)
+            if not futures:
+                del self._waiters[key]
+
+    def _arm(self, loop, deadline: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(deadline, self._expire)
+        self._timer_deadline = deadline
+
+    def _expire(self):
+        """Menggagalkan semua penunggu yang deadline-nya sudah lewat, lalu pasang timer berikutnya."""
+        loop = asyncio.get_running_loop()
+        self._timer = self._timer_deadline = None
+        now = loop.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, key, future = heapq.heappop(self._deadlines)
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError())
+                self._discard(key, future)
+        # Entri yang sudah dijawab tetap di heap sampai deadline-nya, lalu dibuang di sini
+        if self._deadlines:
+            self._arm(loop, self._deadlines[0][0])
@@ -0,0 +1,141 @@
+import time
+import functools
+
+# Batas bucket histogram latensi (detik), batas 3 detik interaksi Discord ada di antaranya
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histogram kumulatif sederhana (format Prometheus)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class HistogramFamily:
+    """Sekumpulan histogram dengan label yang sama (misal: satu per command)."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._children = {}  # {label_values: Histogram}
+
+    def observe(self, label_values: tuple, value: float):
+        histogram = self._children.get(label_values)
+        if histogram is None:
+            histogram = self._children[label_values] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, histogram in self._children.items():
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registry metrik untuk endpoint /metrics (format teks Prometheus).
+    Histogram diisi langsung oleh bot, nilai lain (gauge/counter) dibaca dari collector saat render.
+    """
+
+    def __init__(self):
+        self.command_latency = HistogramFamily(
+            "discord_command_duration_seconds", "Durasi eksekusi app command.", ("command", "status"))
+        self.view_latency = HistogramFamily(
+            "discord_view_callback_duration_seconds", "Durasi callback tombol/menu di view game.", ("view", "callback", "status"))
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """
+        Mendaftarkan fungsi yang mengembalikan list sampel (name, type, help, labels, value).
+        Dipanggil setiap kali /metrics dibaca.
+        """
+        self._collectors.append(collector)
+
+    def observe_command(self, command: str, seconds: float, status: str = "ok"):
+        self.command_latency.observe((command, status), seconds)
+
+    def observe_view(self, view: str, callback: str, seconds: float, status: str = "ok"):
+        self.view_latency.observe((view, callback, status), seconds)
+
+    def timed_callback(self, view: str, callback: str, func):
+        """Membungkus callback item view agar durasinya tercatat."""
+        @functools.wraps(func)
+        async def wrapper(interaction):
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                return await func(interaction)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self.observe_view(view, callback, time.perf_counter() - start, status)
+        return wrapper
+
+    def render(self) -> str:
+        lines = []
+        lines.extend(self.command_latency.render())
+        lines.extend(self.view_latency.render())
+
+        # Sampel dikelompokkan per nama: Prometheus menolak family yang barisnya terpisah-pisah
+        families = {}  # {name: (type, help, [baris sampel])}, urutan kemunculan pertama
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                lines.append(f"# collector error: {e}")
+                continue
+            for name, metric_type, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = (metric_type, help_text, [])
+                family[2].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, (metric_type, help_text, sample_lines) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(sample_lines)
+        return "\n".join(lines) + "\n"
+
+
+# Registry global yang dipakai main.py dan keep_alive.py (HealthServer)
+metrics = MetricsRegistry()
@@ -0,0 +1,169 @@
+import contextvars
+import logging
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import aiohttp
+
+from database import db_time_sink
+
+log = logging.getLogger('interaction_trace')
+
+# Batas waktu Discord untuk merespons/defer interaksi
+INTERACTION_DEADLINE = 3.0
+# Request REST yang merupakan respons awal interaksi (send_message/defer/send_modal/edit_message)
+CALLBACK_PATH = re.compile(r'/interactions/(\d+)/[^/]+/callback')
+
+# Trace interaksi yang sedang diproses task ini (diisi saat handler mulai)
+current_trace = contextvars.ContextVar('current_interaction_trace', default=None)
+
+
+class InteractionTrace:
+    """Catatan waktu satu interaksi: antrean gateway, respons awal, waktu DB & REST."""
+
+    __slots__ = ('interaction_id', 'name', 'gateway_delay', 'started', 'acked', 'db_time', 'db_calls', 'rest_time', 'rest_calls')
+
+    def __init__(self, interaction_id: int, name: str, created_at: datetime):
+        self.interaction_id = interaction_id
+        self.name = name
+        # Selisih jam Discord (snowflake) dengan jam lokal saat handler mulai, dibatasi >= 0 untuk clock skew
+        self.gateway_delay = max(0.0, (datetime.now(timezone.utc) - created_at).total_seconds())
+        self.started = time.perf_counter()
+        self.acked = None
+        self.db_time = 0.0
+        self.db_calls = 0
+        self.rest_time = 0.0
+        self.rest_calls = 0
+
+    def add_db_time(self, seconds: float):
+        self.db_time += seconds
+        self.db_calls += 1
+
+    @property
+    def ack_latency(self):
+        """Waktu sejak interaksi dibuat Discord sampai respons awal selesai dikirim (None jika belum)."""
+        if self.acked is None:
+            return None
+        return self.gateway_delay + (self.acked - self.started)
+
+
+class InteractionTracer:
+    """
+    Tracing interaksi dari diterima sampai respons awal (defer/send_message), plus waktu DB dan REST.
+    Waktu REST diukur lewat aiohttp TraceConfig yang dipasang ke HTTP client discord.py (http_trace).
+    Persentil per command dihitung dari `window` sampel terakhir.
+    """
+
+    def __init__(self, deadline: float = INTERACTION_DEADLINE, warn_margin: float = 0.5, window: int = 1000):
+        """
+        :param deadline: Batas waktu respons awal interaksi (detik).
+        :param warn_margin: Interaksi yang responsnya lebih lambat dari deadline - warn_margin dicatat di log.
+        :param window: Jumlah sampel terakhir per command untuk p50/p95/p99.
+        """
+        self.deadline = deadline
+        self.warn_margin = warn_margin
+        self.window = window
+        self._samples = {}  # {nama: deque((ack_latency, db_time, rest_time))}
+        self.near_deadline = 0
+        self.missed = 0
+
+    def start(self, interaction, name: str):
+        """Dipanggil di awal handler (task yang sama dengan handler) agar DB & REST tercatat ke trace ini."""
+        trace = InteractionTrace(interaction.id, name, interaction.created_at)
+        interaction.extras['trace'] = trace
+        current_trace.set(trace)
+        db_time_sink.set(trace)
+        return trace
+
+    def finish(self, interaction, status: str = "ok"):
+        """Menutup trace interaksi, menyimpan sampel, dan mencatat interaksi yang nyaris/melewati deadline."""
+        trace = interaction.extras.pop('trace', None)
+        if trace is None:
+            return None
+        ack_latency = trace.ack_latency
+        if ack_latency is not None:
+            samples = self._samples.get(trace.name)
+            if samples is None:
+                samples = self._samples[trace.name] = deque(maxlen=self.window)
+            samples.append((ack_latency, trace.db_time, trace.rest_time))
+
+        if ack_latency is None or ack_latency > self.deadline:
+            self.missed += 1
+        elif ack_latency >= self.deadline - self.warn_margin:
+            self.near_deadline += 1
+        else:
+            return trace
+        ack_text = "tidak ada respons" if ack_latency is None else f"respons awal {ack_latency * 1000:.0f} ms"
+        log.warning(
+            f"⏱️ Interaksi {trace.name} ({status}) mendekati/melewati batas {self.deadline:.0f} detik: {ack_text} "
+            f"(antre gateway {trace.gateway_delay * 1000:.0f} ms, DB {trace.db_time * 1000:.0f} ms/{trace.db_calls} query, "
+            f"REST {trace.rest_time * 1000:.0f} ms/{trace.rest_calls} request)")
+        return trace
+
+    def wrap_callback(self, name: str, func):
+        """Membungkus callback item view agar interaksi komponen juga di-trace."""
+        async def traced(interaction):
+            self.start(interaction, name)
+            result = await func(interaction)
+            # Jika callback gagal, trace ditutup oleh on_error view setelah respons error terkirim
+            self.finish(interaction, "ok")
+            return result
+        return traced
+
+    def http_trace(self) -> aiohttp.TraceConfig:
+        """TraceConfig untuk discord.Client(http_trace=...): waktu REST + penanda respons awal."""
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_done(session, context, params):
+            trace = current_trace.get()
+            if trace is None:
+                return
+            now = time.perf_counter()
+            trace.rest_time += now - context.start
+            trace.rest_calls += 1
+            match = CALLBACK_PATH.search(params.url.path)
+            if trace.acked is None and match and int(match.group(1)) == trace.interaction_id:
+                trace.acked = now
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_done)
+        trace_config.on_request_exception.append(on_request_done)
+        return trace_config
+
+    @staticmethod
+    def _percentile(sorted_values, pct: float):
+        index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    def percentiles(self):
+        """{nama: {'count', 'ack': {p50,p95,p99}, 'db': {...}, 'rest': {...}}} dari sampel terakhir."""
+        result = {}
+        for name, samples in list(self._samples.items()):
+            columns = list(zip(*samples))
+            entry = {'count': len(samples)}
+            for key, values in zip(('ack', 'db', 'rest'), columns):
+                values = sorted(values)
+                entry[key] = {pct: self._percentile(values, pct) for pct in (50, 95, 99)}
+            result[name] = entry
+        return result
+
+    def collect_metrics(self):
+        """Sampel summary untuk /metrics."""
+        samples = [
+            ("discord_interaction_near_deadline_total", "counter", "Interaksi yang respons awalnya mendekati batas 3 detik.", {}, self.near_deadline),
+            ("discord_interaction_missed_deadline_total", "counter", "Interaksi tanpa respons awal atau melewati batas 3 detik.", {}, self.missed),
+        ]
+        metric_names = {
+            'ack': ("discord_interaction_ack_seconds", "Waktu dari interaksi dibuat sampai respons awal (defer/send)."),
+            'db': ("discord_interaction_db_seconds", "Waktu query database per interaksi."),
+            'rest': ("discord_interaction_rest_seconds", "Waktu request REST Discord per interaksi."),
+        }
+        for name, entry in self.percentiles().items():
+            for key, (metric, help_text) in metric_names.items():
+                for pct, value in entry[key].items():
+                    samples.append((metric, "summary", help_text, {"command": name, "quantile": str(pct / 100)}, value))
+        return samples
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class XPLedger:
+    """
+    Penampung XP di memori (write-behind) untuk jalur XP di on_message.
+    Grant XP per user digabung, lalu di-flush berkala ke database sebagai
+    satu statement bulk sehingga chat yang ramai tidak membanjiri pool.
+    """
+
+    def __init__(self, db, flush_interval: float = 5.0, max_batch: int = 500, on_level_up=None):
+        """
+        :param db: DatabaseManager yang menyediakan grant_xp_bulk().
+        :param flush_interval: Jeda (detik) antar flush otomatis.
+        :param max_batch: Jumlah user tertunda yang memicu flush lebih awal.
+        :param on_level_up: Coroutine callback(row, context) untuk user yang naik level.
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.on_level_up = on_level_up
+        self._pending = {}  # {user_id: [xp, context]}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id: int, xp: int, context=None):
+        """Mencatat XP untuk user. Context terakhir (misal: pesan) dipakai saat level up."""
+        entry = self._pending.get(user_id)
+        if entry:
+            entry[0] += xp
+            entry[1] = context
+        else:
+            self._pending[user_id] = [xp, context]
+
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def start(self):
+        """Memulai background task flush berkala."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                log.exception(f"❌ Gagal flush XP ledger: {e}")
+
+    async def flush(self):
+        """Menulis semua XP tertunda ke database dan memproses level up."""
+        async with self._lock:
+            if not self._pending:
+                return []
+
+            batch, self._pending = self._pending, {}
+            try:
+                rows = await self.db.grant_xp_bulk({user_id: entry[0] for user_id, entry in batch.items()})
+            except BaseException:
+                # Kembalikan XP ke antrean agar tidak hilang (termasuk saat task di-cancel),
+                # flush berikutnya akan mencoba lagi
+                for user_id, (xp, context) in batch.items():
+                    entry = self._pending.get(user_id)
+                    if entry:
+                        entry[0] += xp
+                    else:
+                        self._pending[user_id] = [xp, context]
+                raise
+
+        if self.on_level_up:
+            for row in rows:
+                if row['new_level'] > row['old_level']:
+                    try:
+                        await self.on_level_up(row, batch[row['user_id']][1])
+                    except Exception as e:
+                        log.exception(f"❌ Gagal memproses level up user {row['user_id']}: {e}")
+        return rows
+
+    async def close(self):
+        """Menghentikan task berkala dan melakukan flush terakhir (dipanggil saat shutdown)."""
+        if self._task:
+            # Task tidak di-cancel: flush yang sedang berjalan ditunggu sampai selesai
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()